@@ -1,8 +1,15 @@
+import time
 import requests
 import openai
 from get_open_api_key import get_open_api_key
+from answer_memo import FUZZY_THRESHOLD, AhoCorasick, AnswerMemo, normalize_text
 
 VERIFY_URL = "https://xyz.ag3nts.org/verify"
+MEMO_PATH = "./cache/W1L02/answer_memo.sqlite"
+TURN_DEADLINE = 6.0  # Seconds the robot allows for each answer
+LLM_MIN_TIME = 2.0  # Minimum time left in a turn to still attempt an LLM call
+MAX_TURNS = 10
+FALLBACK_ANSWER = "I am unable to provide that information."
 
 INCORRECT_ANSWERS = {
     "capital of poland": "Kraków",
@@ -10,67 +17,137 @@ INCORRECT_ANSWERS = {
     "current year": "1999"
 }
 
+# Matcher over normalized override phrases, built once
+OVERRIDE_PHRASES = {normalize_text(phrase): answer for phrase, answer in INCORRECT_ANSWERS.items()}
+override_matcher = AhoCorasick(list(OVERRIDE_PHRASES))
+_answer_memo = None
+
+def get_answer_memo():
+    """Opens the shared answer memo on first use, so importing the module touches no files."""
+    global _answer_memo
+    if _answer_memo is None:
+        _answer_memo = AnswerMemo(MEMO_PATH, fuzzy_threshold=FUZZY_THRESHOLD)
+    return _answer_memo
+
 def initialize_openai_api():
     """Sets up the OpenAI API key for communication."""
     openai.api_key = get_open_api_key()
 
-def start_verification():
-    """Starts the verification by sending 'READY' to the robot and returns the initial question."""
-    try:
-        response = requests.post(VERIFY_URL, json={"text": "READY", "msgID": "0"})
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print("Error initiating verification:", e)
-        return None
-
-def answer_with_openai(question):
+def answer_with_openai(question, timeout=None):
     """Fetches an answer from OpenAI in English regardless of the prompt language."""
+    options = {"request_timeout": timeout} if timeout else {}
     try:
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": f"Answer in English: {question}"}]
+            messages=[{"role": "user", "content": f"Answer in English: {question}"}],
+            **options
         )
         return response['choices'][0]['message']['content']
     except Exception as e:
         print("Error with OpenAI API:", e)
-        return "I am unable to provide that information."
+        return FALLBACK_ANSWER
 
-def construct_answer(question, msg_id):
-    """Constructs the answer based on known incorrect answers, falling back to OpenAI if needed."""
-    for key_phrase, incorrect_answer in INCORRECT_ANSWERS.items():
-        if key_phrase in question.lower():
-            return {"text": incorrect_answer, "msgID": msg_id}
+def find_override(question):
+    """Returns the predefined incorrect answer for the first override phrase found in the question."""
+    matches = override_matcher.find(normalize_text(question))
+    return OVERRIDE_PHRASES[matches[0][1]] if matches else None
 
-    # If no predefined incorrect answer matches, use OpenAI to generate an English response
-    return {"text": answer_with_openai(question), "msgID": msg_id}
+def is_accepted(reply):
+    """Checks whether the robot accepted the answer."""
+    text = str(reply.get("text", "")) if isinstance(reply, dict) else ""
+    return text.upper() == "OK" or "FLG" in text
 
-def send_answer(answer):
-    """Sends the constructed answer to the robot."""
-    try:
-        response = requests.post(VERIFY_URL, json=answer)
+def is_rejected(reply):
+    """Checks whether the robot rejected the answer and ended the dialogue."""
+    text = str(reply.get("text", "")) if isinstance(reply, dict) else ""
+    return text.upper().startswith("ERROR")
+
+def is_continued(reply, msg_id):
+    """Checks whether the robot asked a follow-up question in the same dialogue."""
+    return isinstance(reply, dict) and not is_rejected(reply) and reply.get("msgID") == msg_id
+
+class ConversationEngine:
+    """Drives the whole /verify dialogue over a pooled session, keeping per-msgID state.
+
+    Each turn has a deadline; the answer comes from the override table, the memo
+    or the LLM, and the LLM is only asked when enough of the turn is left.
+    """
+
+    def __init__(self, verify_url=VERIFY_URL, session=None, memo=None, llm=None,
+                 turn_deadline=TURN_DEADLINE, llm_min_time=LLM_MIN_TIME, max_turns=MAX_TURNS):
+        self.verify_url = verify_url
+        self.session = session or requests.Session()
+        self.memo = memo if memo is not None else get_answer_memo()
+        self.llm = llm or answer_with_openai
+        self.turn_deadline = turn_deadline
+        self.llm_min_time = llm_min_time
+        self.max_turns = max_turns
+        self.state = {}  # msgID -> list of {"question", "answer", "source", "elapsed"}
+
+    def post(self, payload, timeout=None):
+        response = self.session.post(self.verify_url, json=payload, timeout=timeout or self.turn_deadline)
         response.raise_for_status()
-        print("Verification response:", response.text)
-    except requests.RequestException as e:
-        print("Error sending answer:", e)
+        return response.json()
 
-def main():
-    initialize_openai_api()
+    def route(self, question, deadline):
+        """Returns (answer, source) for the question within the turn deadline."""
+        incorrect_answer = find_override(question)
+        if incorrect_answer is not None:
+            return incorrect_answer, "override"
+
+        remembered = self.memo.get(question)
+        if remembered is not None:
+            return remembered, "memo"
+
+        remaining = deadline - time.monotonic()
+        if remaining < self.llm_min_time:
+            return FALLBACK_ANSWER, "timeout"
+        return self.llm(question, timeout=remaining), "llm"
+
+    def run(self):
+        """Runs the dialogue from READY until the robot accepts, rejects or max_turns is hit."""
+        reply = self.post({"text": "READY", "msgID": "0"})
+        for _ in range(self.max_turns):
+            if is_accepted(reply):
+                return reply
+            if is_rejected(reply):
+                print("Robot rejected the answer:", reply)
+                return reply
+
+            msg_id = reply.get("msgID")
+            question = reply.get("text", "")
+            if msg_id is None or not question:
+                print("Unexpected robot reply:", reply)
+                return reply
+            print(f"Robot question [{msg_id}]:", question)
 
-    robot_response = start_verification()
-    if not robot_response:
-        print("Failed to start verification process.")
-        return
+            started = time.monotonic()
+            answer, source = self.route(question, started + self.turn_deadline)
+            pending = {"question": question, "answer": answer, "source": source}
+            self.state.setdefault(str(msg_id), []).append(pending)
 
-    question_text = robot_response.get("text")
-    msg_id = robot_response.get("msgID")
+            remaining = max(started + self.turn_deadline - time.monotonic(), 0.1)
+            reply = self.post({"text": answer, "msgID": msg_id}, timeout=remaining)
+            pending["elapsed"] = time.monotonic() - started
+            print(f"Answered '{answer}' via {source} in {pending['elapsed']:.2f}s")
+            # The robot only continues the dialogue (or says OK) after a correct answer
+            if source == "llm" and (is_accepted(reply) or is_continued(reply, msg_id)):
+                self.memo.put(question, answer)
 
-    print("Robot question:", question_text)
-    
-    answer = construct_answer(question_text, msg_id)
-    print(answer)
-    if answer:
-        send_answer(answer)
+        print("Maximum number of turns reached.")
+        return reply
+
+def main():
+    initialize_openai_api()
+
+    engine = ConversationEngine()
+    try:
+        final_reply = engine.run()
+        print("Final robot reply:", final_reply)
+    except requests.RequestException as e:
+        print("Error during verification dialogue:", e)
+    finally:
+        engine.session.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
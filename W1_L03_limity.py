@@ -1,11 +1,20 @@
 import json
+import argparse
+import tempfile
 import requests
 import openai
+from concurrent.futures import ThreadPoolExecutor
+from arithmetic_eval import evaluate_questions
+from json_stream import JsonStreamReader
 
 # Constants
 SECRETS_PATH = 'secrets.json'
 OUTPUT_URL = 'https://centrala.ag3nts.org/report'
 DATA_URL_TEMPLATE = 'https://centrala.ag3nts.org/data/{central_key}/json.txt'
+STREAM_BATCH_SIZE = 1000  # test-data items evaluated per bulk call in streaming mode
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Spooled output moves from memory to disk above this size
+MAX_LLM_WORKERS = 5  # Concurrent requests for the embedded "test" questions
 
 # Load secrets from secrets.json
 def load_secrets(filepath):
@@ -40,20 +49,34 @@ def fetch_data_from_url(url):
         print(f"Error fetching data: {e}")
         return {}
 
+def answer_test_questions(questions):
+    """Answer each distinct "test" question once, with bounded parallelism."""
+    unique = list(dict.fromkeys(questions))
+    if not unique:
+        return {}
+    print(f"Answering {len(unique)} distinct test questions ({len(questions)} in total)...")
+    with ThreadPoolExecutor(max_workers=min(len(unique), MAX_LLM_WORKERS)) as executor:
+        return dict(zip(unique, executor.map(get_chatgpt_response, unique)))
+
 def process_test_data(data):
     """Process the test data and add answers."""
-    for item in data.get("test-data", []):
-        question = item.get("question")
-        if question:
-            try:
-                result = eval(question)  # Evaluate the arithmetic expression
-                item["answer"] = result
-                if "test" in item:
-                    print(f"'test' tag found: {item['test']}")
-                    item['test']['a'] = get_chatgpt_response(item['test']['q'])
-                    print(item['test']['a'])
-            except Exception as e:
-                print(f"Error evaluating expression '{question}': {e}")
+    items = [item for item in data.get("test-data", []) if item.get("question")]
+    # Evaluate all arithmetic expressions in bulk, without eval
+    answers = evaluate_questions([item["question"] for item in items])
+    test_items = []
+    for item, answer in zip(items, answers):
+        if answer is None:
+            continue
+        item["answer"] = answer
+        if "test" in item:
+            print(f"'test' tag found: {item['test']}")
+            test_items.append(item)
+
+    # The LLM questions are only collected above, so the arithmetic pass never waits on them
+    test_answers = answer_test_questions([item['test']['q'] for item in test_items])
+    for item in test_items:
+        item['test']['a'] = test_answers[item['test']['q']]
+        print(f"{item['test']['q']} -> {item['test']['a']}")
 
 def send_json_to_api(url, json_data):
     """Send JSON data to the API and return the response."""
@@ -74,7 +97,73 @@ def build_json_message(data):
         "answer": data
     }
 
+def write_stream_message(reader, out):
+    """Write the corrected report to out, processing test-data in batches as it streams in."""
+    def write(text):
+        out.write(text.encode('utf-8'))
+
+    def dump(value):
+        return json.dumps(value, ensure_ascii=False)
+
+    item_count = 0
+    write('{"task": "JSON", "apikey": ' + dump(central_key) + ', "answer": {')
+    for index, (key, value) in enumerate(reader.iter_object(stream_key="test-data")):
+        if index:
+            write(', ')
+        write(dump(key) + ': ')
+        if key == "apikey":
+            value = central_key
+        if key != "test-data" or isinstance(value, list):
+            write(dump(value))
+            continue
+
+        write('[')
+        batch = []
+        for item in value:
+            batch.append(item)
+            if len(batch) == STREAM_BATCH_SIZE:
+                item_count += write_batch(batch, write, item_count)
+                batch = []
+        item_count += write_batch(batch, write, item_count)
+        write(']')
+    write('}}')
+    return item_count
+
+def write_batch(batch, write, written):
+    """Process one batch of test-data items and append them to the array being written."""
+    process_test_data({"test-data": batch})
+    for index, item in enumerate(batch):
+        write((', ' if written + index else '') + json.dumps(item, ensure_ascii=False))
+    return len(batch)
+
+def main_stream():
+    """Streaming variant: peak memory stays flat regardless of the size of json.txt."""
+    data_url = DATA_URL_TEMPLATE.format(central_key=central_key)
+    headers = {'Content-Type': 'application/json; charset=utf-8'}
+    try:
+        with requests.get(data_url, stream=True) as source, \
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as out:
+            source.raise_for_status()
+            source.encoding = source.encoding or 'utf-8'
+            reader = JsonStreamReader(source.iter_content(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=True))
+            item_count = write_stream_message(reader, out)
+            size = out.tell()
+            out.seek(0)
+            print(f"Sending JSON data: {item_count} test-data items, {size} bytes")
+            response = requests.post(OUTPUT_URL, data=out, headers=headers)
+            response.raise_for_status()
+            print("Response from API:", response.json())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Error streaming data: {e}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Fix the calibration file and send it to centrala")
+    parser.add_argument('-stream', action='store_true', help='Stream json.txt through a spooled file instead of loading it into memory')
+    args = parser.parse_args()
+    if args.stream:
+        main_stream()
+        return
+
     # Fetch the data
     data_url = DATA_URL_TEMPLATE.format(central_key=central_key)
     data = fetch_data_from_url(data_url)
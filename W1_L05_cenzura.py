@@ -1,13 +1,23 @@
 import json
+import time
 import requests
 import re
 import openai
+from concurrent.futures import ThreadPoolExecutor
+from censor_engine import (
+    censor_text, find_sensitive_spans, censored_spans, consistent_spans, apply_spans, split_chunks
+)
 
 # Constants
 SECRETS_PATH = 'secrets.json'
 TASK_ID = "CENZURA"
 OUTPUT_URL = 'https://centrala.ag3nts.org/report'
 CENSORED_FILE_URL = "https://centrala.ag3nts.org/data/{central_key}/cenzura.txt"
+USE_LOCAL_CENSOR = True  # Regex/gazetteer pre-censor; the LLM only judges spans it cannot resolve
+CONTEXT_CHARS = 60  # Characters of context shown around each unresolved span
+CHUNK_CHARS = 1500  # Target chunk size for censoring long documents with GPT
+CHUNK_OVERLAP_CHARS = 300  # Preceding sentences sent with each chunk as read-only context
+MAX_WORKERS = 5
 
 # Load secrets from secrets.json
 def load_secrets(filepath):
@@ -20,8 +30,12 @@ def load_secrets(filepath):
 open_api_key, central_key = load_secrets(SECRETS_PATH)
 openai.api_key = open_api_key  # Set OpenAI API key
 
-def get_chatgpt_response(text):
+def get_chatgpt_response(text, context=""):
     """Anonymize text using OpenAI GPT model."""
+    context_note = (
+        f"The text continues the following passage, given only for context (do not return it):\n{context}\n\n"
+        if context else ""
+    )
     try:
         response = openai.ChatCompletion.create(
             model="gpt-4o",  # Or "gpt-4-turbo" if applicable
@@ -35,7 +49,7 @@ def get_chatgpt_response(text):
                     "content": (
                         f"Anonymize the following text by replacing sensitive information such as "
                         f"names, addresses, cities, and ages with the word 'CENZURA'. Preserve all "
-                        f"punctuation, spaces, and formatting:\n\n{text}"
+                        f"punctuation, spaces, and formatting:\n\n{context_note}{text}"
                     )
                 }
             ]
@@ -45,6 +59,42 @@ def get_chatgpt_response(text):
         print(f"OpenAI API Error: {e}")
         return None
 
+def resolve_candidates_with_llm(text, candidates):
+    """Ask the LLM which unresolved spans are personal data.
+
+    Only candidate numbers come back, so the model never rewrites the text itself.
+    """
+    listing = []
+    for number, (start, end, kind) in enumerate(candidates, 1):
+        context = text[max(0, start - CONTEXT_CHARS):end + CONTEXT_CHARS].replace("\n", " ")
+        listing.append(f'{number}. "{text[start:end]}" (possible {kind}) in: ...{context}...')
+    print(f"Asking GPT about {len(candidates)} unresolved spans...")
+    try:
+        response = openai.ChatCompletion.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a tool that detects sensitive personal information."
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        "For each numbered fragment decide whether it is a person's first name or surname, "
+                        "a city, a street address or an age. Reply only with a JSON list of the numbers "
+                        "of the fragments that are, e.g. [1, 3].\n\n" + "\n".join(listing)
+                    )
+                }
+            ]
+        )
+        reply = response['choices'][0]['message']['content']
+        selected = set(json.loads(re.search(r"\[.*?\]", reply, re.DOTALL).group()))
+        return [number in selected for number in range(1, len(candidates) + 1)]
+    except (openai.error.OpenAIError, AttributeError, ValueError) as e:
+        # Without a verdict, censoring is the safe choice
+        print(f"Could not resolve spans with GPT ({e}), censoring all of them")
+        return [True] * len(candidates)
+
 def fetch_file(url):
     """Fetch and return the content of the file."""
     try:
@@ -55,11 +105,37 @@ def fetch_file(url):
         print(f"Error fetching file: {e}")
         return None
 
+def censor_chunk_with_gpt(content, context_start, start, end):
+    """Censor content[start:end] with GPT and return the censored spans in document offsets."""
+    chunk = content[start:end]
+    censored = get_chatgpt_response(chunk, context=content[context_start:start])
+    spans = censored_spans(chunk, censored) if censored else None
+    if spans is None:
+        # GPT failed or changed the layout: fall back to the local pre-censor for this chunk
+        print(f"Chunk at {start}-{end} not usable from GPT, censoring it locally")
+        spans, _ = find_sensitive_spans(chunk)
+    return [(span_start + start, span_end + start, kind) for span_start, span_end, kind in spans]
+
+def censor_in_chunks(content):
+    """Censor a long document chunk by chunk in parallel, then make the result consistent."""
+    chunks = split_chunks(content, CHUNK_CHARS, CHUNK_OVERLAP_CHARS)
+    print(f"Sending {len(chunks)} chunks to GPT for anonymization...")
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_WORKERS)) as executor:
+        # map keeps chunk order, so spans come back in document order
+        results = executor.map(lambda chunk: censor_chunk_with_gpt(content, *chunk), chunks)
+        spans = [span for chunk_spans in results for span in chunk_spans]
+    return apply_spans(content, consistent_spans(content, spans))
+
 def process_censored_file(content):
-    """Anonymize the content of the file using GPT."""
-    if content:
-        print("Sending content to GPT for anonymization...")
-        return get_chatgpt_response(content)
+    """Anonymize the content of the file, locally where possible and with GPT otherwise."""
+    if content and USE_LOCAL_CENSOR:
+        start = time.perf_counter()
+        censored = censor_text(content, resolve=resolve_candidates_with_llm)
+        print(f"Censoring took {(time.perf_counter() - start) * 1e3:.1f} ms")
+        return censored
+    elif content:
+        # Chunk output is checked against its input and applied as spans, so the layout is kept
+        return censor_in_chunks(content)
     else:
         print("No content to process.")
         return None
@@ -1,6 +1,11 @@
+import os
 import json
+import hashlib
 import requests
 import openai
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from kv_store import KVStore
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 
@@ -8,11 +13,23 @@ from get_open_api_key import get_open_api_key
 TASK_ID = "robotid"
 INPUT_URL = "https://centrala.ag3nts.org/data/{api_key}/robotid.json"
 OUTPUT_URL = 'https://centrala.ag3nts.org/report'
+CACHE_FOLDER = "./cache/W2L03"
+CACHE_DB = os.path.join(CACHE_FOLDER, "robotid.sqlite")
+IMAGE_FOLDER = os.path.join(CACHE_FOLDER, "images")
+PROMPT_VERSION = "v1"  # Bump when the refinement prompt changes to invalidate cached prompts
+PROMPT_MAX_CHARS = 900
 
 # Initialize API keys
 central_key = get_api_key()
 openai.api_key = get_open_api_key()
 
+# Two-level cache: description hash -> refined prompt, prompt hash -> generated image
+prompt_cache = KVStore(CACHE_DB, table="prompts")
+image_cache = KVStore(CACHE_DB, table="images")
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 def download_description(api_key):
     """Download description from the INPUT_URL."""
     url = INPUT_URL.format(api_key=api_key)
@@ -53,6 +70,77 @@ def refine_prompt_with_gpt(description):
         print(f"Error refining prompt with GPT: {e}")
         return None
 
+def fit_prompt_length(prompt, max_chars=PROMPT_MAX_CHARS):
+    """Validate the prompt length locally, cutting at the last full sentence that fits."""
+    prompt = prompt.strip()
+    if len(prompt) <= max_chars:
+        return prompt
+    cut = prompt[:max_chars]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    shortened = cut[:sentence_end + 1] if sentence_end > 0 else cut.rsplit(" ", 1)[0]
+    print(f"Prompt has {len(prompt)} characters, shortened to {len(shortened)} (limit {max_chars})")
+    return shortened
+
+def get_refined_prompt(description):
+    """Return the refined prompt for the description, from the cache when the description is unchanged."""
+    key = content_hash(PROMPT_VERSION + description)
+    cached = prompt_cache.get(key)
+    if cached:
+        print("Using cached refined prompt.")
+        return cached
+    refined_prompt = refine_prompt_with_gpt(description)
+    if not refined_prompt:
+        return None
+    refined_prompt = fit_prompt_length(refined_prompt)
+    prompt_cache.put(key, refined_prompt)
+    return refined_prompt
+
+def is_image_url_valid(url):
+    """Check that a generated image URL can still be fetched (DALL-E links expire after a while)."""
+    # Signed blob URLs carry their expiry time in the 'se' parameter; check that without a request
+    expiry = parse_qs(urlparse(url).query).get("se")
+    if expiry:
+        try:
+            if datetime.fromisoformat(expiry[0].replace("Z", "+00:00")) <= datetime.now(timezone.utc):
+                return False
+        except ValueError:
+            pass
+    try:
+        response = requests.head(url, timeout=10, allow_redirects=True)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+def save_image_bytes(url, path):
+    """Download the generated image so a copy survives the URL expiring."""
+    try:
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading image: {e}")
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return path
+
+def get_image_url(prompt):
+    """Return an image URL for the prompt, reusing the cached one while it is still valid."""
+    key = content_hash(prompt)
+    cached = image_cache.get(key)
+    if cached and is_image_url_valid(cached["url"]):
+        print(f"Using cached image URL (local copy: {cached.get('path')}).")
+        return cached["url"]
+    if cached:
+        print("Cached image URL has expired, generating a new image.")
+
+    image_url = generate_image(prompt)
+    if not image_url:
+        return None
+    path = save_image_bytes(image_url, os.path.join(IMAGE_FOLDER, f"{key}.png"))
+    image_cache.put(key, {"url": image_url, "path": path, "prompt": prompt})
+    return image_url
+
 def generate_image(prompt):
     """Generate an image using the DALL-E API."""
     try:
@@ -95,7 +183,7 @@ def main():
         description_text = str(description_data)
 
     print("Description text:", description_text)
-    refined_prompt = refine_prompt_with_gpt(description_text)
+    refined_prompt = get_refined_prompt(description_text)
     if not refined_prompt:
         print("Failed to refine the prompt with GPT.")
         return
@@ -103,7 +191,7 @@ def main():
     print("Refined prompt for image generation:", refined_prompt)
 
     # Step 3: Generate an image using DALL-E
-    image_url = generate_image(refined_prompt)
+    image_url = get_image_url(refined_prompt)
     if not image_url:
         print("Failed to generate image.")
         return
@@ -6,6 +6,11 @@ import openai
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 import hashlib
+import re
+import numpy as np
+from kv_store import KVStore
+from artifact_store import fetch_and_extract
+from image_payload import image_content
 
 # Constants
 TASK_ID = "kategorie"
@@ -13,53 +18,91 @@ INPUT_URL = "https://centrala.ag3nts.org/dane/pliki_z_fabryki.zip"
 OUTPUT_URL = "https://centrala.ag3nts.org/report"
 EXTRACTION_FOLDER = "./extracted_files"
 FACTS_FOLDER = "fakty"
-CACHE_FILE = "classification_cache.json"
+CACHE_DB = "kategorie_cache.sqlite"
+CACHE_FILE = "classification_cache.json"  # Legacy JSON cache, imported into CACHE_DB once
+LABEL_CACHE_FILE = "classification_labels.json"  # Legacy JSON labels, imported into CACHE_DB once
+FINGERPRINT_INDEX_FILE = "file_fingerprints.json"
+HASH_CHUNK_SIZE = 1024 * 1024  # Read size used when streaming files through the hash
 
 # Initialize API keys
 central_key = get_api_key()
 openai.api_key = get_open_api_key()
 
-# Load cache for MP3 and image processing
-classification_cache = {}
-if os.path.exists(CACHE_FILE):
-    with open(CACHE_FILE, "r") as cache_file:
-        classification_cache = json.load(cache_file)
+# Cache for MP3 and image processing
+classification_cache = KVStore(CACHE_DB, table="classification", legacy_json_path=CACHE_FILE)
 
+# Labels from previous runs, used to skip and to train the local pre-classifier
+label_cache = KVStore(CACHE_DB, table="labels", legacy_json_path=LABEL_CACHE_FILE)
 
-def save_cache():
-    """Save the classification cache to a file."""
-    with open(CACHE_FILE, "w") as cache_file:
-        json.dump(classification_cache, cache_file, indent=4)
+# Load the (path, size, mtime) -> content hash index so unchanged files are not re-read
+fingerprint_index = {}
+if os.path.exists(FINGERPRINT_INDEX_FILE):
+    with open(FINGERPRINT_INDEX_FILE, "r", encoding="utf-8") as index_file:
+        fingerprint_index = json.load(index_file)
+fingerprint_index_dirty = False
+
+
+def save_fingerprint_index():
+    """Save the fingerprint index to a file if it changed."""
+    global fingerprint_index_dirty
+    if not fingerprint_index_dirty:
+        return
+    with open(FINGERPRINT_INDEX_FILE, "w", encoding="utf-8") as index_file:
+        json.dump(fingerprint_index, index_file, indent=4, ensure_ascii=False)
+    fingerprint_index_dirty = False
 
 
 def generate_file_hash(file_path):
-    """Generate a hash for the file content."""
-    hasher = hashlib.md5()
+    """Generate a hash for the file content, reusing the stored one if size and mtime match."""
+    global fingerprint_index_dirty
+    key = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    entry = fingerprint_index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["hash"]
+
+    hasher = hashlib.blake2b(digest_size=16)
     with open(file_path, "rb") as f:
-        hasher.update(f.read())
-    return hasher.hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    file_hash = hasher.hexdigest()
+
+    fingerprint_index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": file_hash}
+    fingerprint_index_dirty = True
+    return file_hash
+
+
+CATEGORIES = ("people", "hardware", "none")
+BATCH_MAX_FILES = 20  # Upper bound of files packed into one classification request
+BATCH_MAX_CHARS = 24000  # Rough budget for extracted text per request (~6k tokens)
+
+CLASSIFICATION_RULES = (
+    "You are an assistant that classifies files into categories based on their content. "
+    "Use the following rules:\n"
+    "1 (people): Reports or files about detained individuals or traces of their presence.\n"
+    "2 (hardware): Reports or files describing physical problems with devices or hardware issues.\n"
+    "Output only 'people' or 'hardware' for matching categories, and 'none' if it does not match.\n"
+    "For reference:\n"
+    "people: '2024-11-12_report-00-sektor_C4.txt', '2024-11-12_report-07-sektor_C4.txt', '2024-11-12_report-10-sektor-C1.mp3'\n"
+    "hardware: '2024-11-12_report-13.png', '2024-11-12_report-15.png', '2024-11-12_report-17.png'\n"
+)
+
+BATCH_INSTRUCTIONS = (
+    "You will receive several files, each wrapped in <file id=\"...\"> tags. "
+    "Classify every file independently using the rules above. "
+    "Return only a JSON object mapping each file id to 'people', 'hardware' or 'none', "
+    "with no additional comments."
+)
 
 
 def classify_file_content(content):
-    """Classify text content into one of the categories."""
+    """Classify text content into one of the categories; None if the request failed."""
     try:
         response = openai.ChatCompletion.create(
             model="gpt-4",
             temperature=0.5,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an assistant that classifies files into categories based on their content. "
-                        "Use the following rules:\n"
-                        "1 (people): Reports or files about detained individuals or traces of their presence.\n"
-                        "2 (hardware): Reports or files describing physical problems with devices or hardware issues.\n"
-                        "Output only 'people' or 'hardware' for matching categories, and 'none' if it does not match.\n"
-                        "For reference:\n"
-                        "people: '2024-11-12_report-00-sektor_C4.txt', '2024-11-12_report-07-sektor_C4.txt', '2024-11-12_report-10-sektor-C1.mp3'\n"
-                        "hardware: '2024-11-12_report-13.png', '2024-11-12_report-15.png', '2024-11-12_report-17.png'\n"
-                    )
-                },
+                {"role": "system", "content": CLASSIFICATION_RULES},
                 {"role": "user", "content": content}
             ]
         )
@@ -67,7 +110,240 @@ def classify_file_content(content):
         return category
     except openai.error.OpenAIError as e:
         print(f"Error during classification: {e}")
-        return "none"
+        return None
+
+
+def build_batches(contents):
+    """Pack (file_id, content) pairs into batches that fit the request budget."""
+    batches = []
+    current, current_size = [], 0
+    for file_id, content in contents.items():
+        size = len(content) + len(file_id)
+        if current and (len(current) >= BATCH_MAX_FILES or current_size + size > BATCH_MAX_CHARS):
+            batches.append(current)
+            current, current_size = [], 0
+        current.append((file_id, content))
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_reply(reply, file_ids):
+    """Parse a batch reply into {file_id: category}, or return None if it is malformed."""
+    reply = reply.strip()
+    if reply.startswith("```"):
+        reply = reply.strip("`")
+        reply = reply[reply.find("{"):]
+    try:
+        labels = json.loads(reply)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(labels, dict):
+        return None
+
+    parsed = {}
+    for file_id in file_ids:
+        category = str(labels.get(file_id, "")).strip().lower()
+        if category not in CATEGORIES:
+            return None
+        parsed[file_id] = category
+    return parsed
+
+
+def classify_batch(batch):
+    """Classify a batch of (file_id, content) pairs in one request."""
+    file_ids = [file_id for file_id, _ in batch]
+    user_content = "\n\n".join(
+        f'<file id="{file_id}">\n{content}\n</file>' for file_id, content in batch
+    )
+    try:
+        response = openai.ChatCompletion.create(
+            model="gpt-4",
+            temperature=0.0,
+            messages=[
+                {"role": "system", "content": CLASSIFICATION_RULES + "\n" + BATCH_INSTRUCTIONS},
+                {"role": "user", "content": user_content}
+            ]
+        )
+        labels = parse_batch_reply(response['choices'][0]['message']['content'], file_ids)
+    except openai.error.OpenAIError as e:
+        print(f"Error during batch classification: {e}")
+        labels = None
+
+    if labels is None:
+        print(f"Malformed batch reply for {len(batch)} files, falling back to per-file classification.")
+        labels = {file_id: classify_file_content(content) for file_id, content in batch}
+    return labels
+
+
+# Per-category term weights, matched as token prefixes (Polish stems and English words)
+CATEGORY_TERMS = {
+    "people": {
+        "zatrzyma": 3.0, "aresztowa": 3.0, "odcisk": 3.0, "intruz": 2.5,
+        "osob": 1.5, "przesłucha": 2.5, "ujęt": 2.5, "podejrzan": 2.0, "ślad": 1.5,
+        "detain": 3.0, "arrest": 3.0, "fingerprint": 3.0, "intruder": 2.5, "suspect": 2.0,
+    },
+    "hardware": {
+        "napraw": 3.0, "anten": 2.5, "usterk": 3.0, "awari": 3.0, "wymian": 2.0,
+        "przewod": 2.0, "kabel": 2.0, "czujnik": 2.0, "bateri": 1.5, "zwarci": 2.5,
+        "repair": 3.0, "antenna": 2.5, "malfunction": 3.0, "cable": 2.0, "sensor": 2.0,
+    },
+}
+KEYWORD_MIN_SCORE = 6.0  # Keyword score needed to decide locally when the other category scores zero
+MODEL_MIN_LABELS = 8  # Cached labels needed before the TF-IDF model is trained
+MODEL_MIN_CONFIDENCE = 0.9  # Probability needed to accept the TF-IDF model prediction
+STEM_LENGTH = 5  # Token prefix length used as the TF-IDF feature
+
+
+def tokenize(text):
+    """Lowercase text and split it into word tokens."""
+    return re.findall(r"\w+", text.lower())
+
+
+def stems(text):
+    """Crude Polish stemming: truncate tokens so inflected forms share a feature."""
+    return [token[:STEM_LENGTH] for token in tokenize(text)]
+
+
+def text_hash(text):
+    """Hash extracted text, used as the label cache key."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def keyword_scores(tokens):
+    """Score tokens against the per-category term weights."""
+    scores = {}
+    for category, terms in CATEGORY_TERMS.items():
+        scores[category] = sum(
+            weight for token in tokens for term, weight in terms.items() if token.startswith(term)
+        )
+    return scores
+
+
+class TfidfLogisticClassifier:
+    """Small TF-IDF + softmax regression model trained on cached labels."""
+
+    def __init__(self, epochs=300, learning_rate=0.5, l2=1e-3):
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.vocabulary = {}
+        self.idf = None
+        self.classes = []
+        self.weights = None
+        self.bias = None
+
+    def _vectorize(self, token_lists):
+        matrix = np.zeros((len(token_lists), len(self.vocabulary)))
+        for row, tokens in enumerate(token_lists):
+            for token in tokens:
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    matrix[row, column] += 1.0
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def fit(self, texts, labels):
+        token_lists = [stems(text) for text in texts]
+        document_frequency = {}
+        for tokens in token_lists:
+            for token in set(tokens):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.vocabulary = {token: index for index, token in enumerate(sorted(document_frequency))}
+        counts = np.array([document_frequency[token] for token in sorted(document_frequency)], dtype=float)
+        self.idf = np.log((1 + len(texts)) / (1 + counts)) + 1.0
+
+        self.classes = sorted(set(labels))
+        features = self._vectorize(token_lists)
+        targets = np.zeros((len(labels), len(self.classes)))
+        for row, label in enumerate(labels):
+            targets[row, self.classes.index(label)] = 1.0
+
+        self.weights = np.zeros((features.shape[1], len(self.classes)))
+        self.bias = np.zeros(len(self.classes))
+        for _ in range(self.epochs):
+            probabilities = self._softmax(features @ self.weights + self.bias)
+            error = (probabilities - targets) / len(labels)
+            self.weights -= self.learning_rate * (features.T @ error + self.l2 * self.weights)
+            self.bias -= self.learning_rate * error.sum(axis=0)
+        return self
+
+    def predict(self, text):
+        """Return (label, probability) for a single text."""
+        probabilities = self._softmax(self._vectorize([stems(text)]) @ self.weights + self.bias)[0]
+        best = int(np.argmax(probabilities))
+        return self.classes[best], float(probabilities[best])
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exponents = np.exp(logits)
+        return exponents / exponents.sum(axis=1, keepdims=True)
+
+
+def train_preclassifier():
+    """Train the TF-IDF model on cached labels, or return None if there are too few."""
+    entries = [entry for entry in label_cache.values() if entry.get("label") in CATEGORIES]
+    if len(entries) < MODEL_MIN_LABELS or len({entry["label"] for entry in entries}) < 2:
+        return None
+    print(f"Training local pre-classifier on {len(entries)} cached labels.")
+    return TfidfLogisticClassifier().fit(
+        [entry["text"] for entry in entries], [entry["label"] for entry in entries]
+    )
+
+
+def preclassify(content, model):
+    """Return a confident local label for content, or None if the LLM should decide."""
+    cached = label_cache.get(text_hash(content))
+    if cached and cached.get("label") in CATEGORIES:
+        return cached["label"]
+
+    if model is not None:
+        label, probability = model.predict(content)
+        if probability >= MODEL_MIN_CONFIDENCE:
+            return label
+
+    scores = keyword_scores(tokenize(content))
+    people, hardware = scores["people"], scores["hardware"]
+    if people >= KEYWORD_MIN_SCORE and hardware == 0:
+        return "people"
+    if hardware >= KEYWORD_MIN_SCORE and people == 0:
+        return "hardware"
+    return None
+
+
+def classify_contents(contents):
+    """Classify {file_id: content}, locally where confident and in LLM batches otherwise."""
+    labels = {}
+    model = train_preclassifier()
+    uncertain = {}
+    for file_id, content in contents.items():
+        label = preclassify(content, model)
+        if label is None:
+            uncertain[file_id] = content
+        else:
+            labels[file_id] = label
+
+    batches = build_batches(uncertain)
+    print(f"Classifying {len(uncertain)} uncertain files in {len(batches)} batched requests.")
+    for batch in batches:
+        batch_labels = classify_batch(batch)
+        labels.update(batch_labels)
+        # Failed requests (None) and free-form replies must not become permanent answers
+        label_cache.batch_put({
+            text_hash(content): {"label": batch_labels[file_id], "text": content}
+            for file_id, content in batch
+            if batch_labels[file_id] in CATEGORIES
+        })
+
+    if contents:
+        avoided = len(contents) - len(uncertain)
+        print(f"Pre-classifier decided {avoided}/{len(contents)} files locally "
+              f"(LLM-call avoidance rate: {avoided / len(contents):.0%}).")
+    return labels
 
 
 def transcribe_audio_with_openai(file_path):
@@ -76,8 +352,9 @@ def transcribe_audio_with_openai(file_path):
         file_hash = generate_file_hash(file_path)
 
         # Check if result is already cached
-        if file_hash in classification_cache:
-            return classification_cache[file_hash]
+        cached = classification_cache.get(file_hash)
+        if cached is not None:
+            return cached
 
         print(f"Transcribing audio file: {file_path}")
         with open(file_path, "rb") as audio_file:
@@ -85,8 +362,7 @@ def transcribe_audio_with_openai(file_path):
             transcription = response.get("text", "")
 
         # Cache the result
-        classification_cache[file_hash] = transcription
-        save_cache()
+        classification_cache.put(file_hash, transcription)
         return transcription
     except Exception as e:
         print(f"Error transcribing audio file {file_path}: {e}")
@@ -99,35 +375,37 @@ def analyze_image_with_openai(file_path):
         file_hash = generate_file_hash(file_path)
 
         # Check if result is already cached
-        if file_hash in classification_cache:
-            return classification_cache[file_hash]
+        cached = classification_cache.get(file_hash)
+        if cached is not None:
+            return cached
 
         print(f"Analyzing image file: {file_path}")
-        with open(file_path, "rb") as image_file:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                temperature=0.5,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are an assistant that interprets images and extracts meaningful text or descriptions. "
-                            "Analyze the image content and decide if it relates to 'people' (detained individuals), "
-                            "'hardware' (device issues), or 'none'."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": "Analyze this image for classification."
-                    }
-                ],
-                files={"image": image_file},
-            )
-            description = response['choices'][0]['message']['content'].strip()
+        response = openai.ChatCompletion.create(
+            model="gpt-4o",
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are an assistant that interprets images and extracts meaningful text or descriptions. "
+                        "Analyze the image content and decide if it relates to 'people' (detained individuals), "
+                        "'hardware' (device issues), or 'none'."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Analyze this image for classification."},
+                        # Scanned reports: keep enough detail to read the text
+                        image_content(file_path, detail="high")
+                    ]
+                }
+            ],
+        )
+        description = response['choices'][0]['message']['content'].strip()
 
         # Cache the result
-        classification_cache[file_hash] = description
-        save_cache()
+        classification_cache.put(file_hash, description)
         return description
     except Exception as e:
         print(f"Error analyzing image file {file_path}: {e}")
@@ -137,6 +415,7 @@ def analyze_image_with_openai(file_path):
 def process_files():
     """Process all files in the extraction folder, excluding the facts folder."""
     classified_files = {"people": [], "hardware": []}
+    contents = {}
 
     for root, dirs, files in os.walk(EXTRACTION_FOLDER):
         # Skip the "fakty" folder
@@ -169,12 +448,16 @@ def process_files():
                 print(f"Empty or unsupported content in file: {file}")
                 continue
 
-            # Classify the content
-            classification = classify_file_content(content)
-            if classification in classified_files:
-                classified_files[classification].append(file)
-            else:
-                print(f"Unclassified file: {file}")
+            contents[file] = content
+
+    # Classify the collected contents in batches
+    for file, classification in classify_contents(contents).items():
+        if classification in classified_files:
+            classified_files[classification].append(file)
+        else:
+            print(f"Unclassified file: {file}")
+
+    save_fingerprint_index()
 
     # Sort lists alphabetically
     for key in classified_files:
@@ -184,19 +467,9 @@ def process_files():
 
 
 def download_and_extract_zip(url, extraction_path):
-    """Download and extract a ZIP file."""
+    """Fetch the ZIP through the shared artifact store and extract only what changed."""
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        zip_path = os.path.join(extraction_path, "files.zip")
-
-        with open(zip_path, "wb") as zip_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                zip_file.write(chunk)
-
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(extraction_path)
-        print("Files extracted successfully.")
+        fetch_and_extract(url, extraction_path)
     except requests.exceptions.RequestException as e:
         print(f"Error downloading ZIP file: {e}")
     except zipfile.BadZipFile:
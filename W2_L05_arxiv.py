@@ -2,13 +2,13 @@ import os
 import re
 import json
 import requests
-import base64
 import openai
 from pathlib import Path
 from bs4 import BeautifulSoup
 from typing import Dict
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
+from image_payload import image_content
 
 TASK_ID = "arxiv"
 INPUT_ARTICLE_URL = "https://centrala.ag3nts.org/dane/arxiv-draft.html"
@@ -70,10 +70,6 @@ def describe_image(client: openai, image_url: str, figcaption: str, cache_dir: s
     with open(image_file, 'wb') as f:
         f.write(response.content)
     
-    # Convert image to base64
-    with open(image_file, 'rb') as f:
-        base64_image = base64.b64encode(f.read()).decode('utf-8')
-    
     # Get description from GPT-4 Vision
     response = openai.ChatCompletion.create(
         messages=[
@@ -84,12 +80,8 @@ def describe_image(client: openai, image_url: str, figcaption: str, cache_dir: s
             {
                 "role": "user",
                 "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        }
-                    },
+                    # Format detected, downsized and re-encoded before sending
+                    image_content(image_file),
                     {
                         "type": "text",
                         "text": f"Podpis: {figcaption}\nPodaj szczegółowy opis."
@@ -2,10 +2,15 @@ import os
 import json
 import requests
 import zipfile
+import hashlib
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Set
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
+from artifact_store import fetch_and_extract
 import openai
 
 TASK_ID = "dokumenty"
@@ -13,28 +18,40 @@ INPUT_DATA = "https://centrala.ag3nts.org/dane/pliki_z_fabryki.zip"
 OUTPUT_URL = "https://centrala.ag3nts.org/report"
 EXTRACTION_FOLDER = "./extracted_files/W3L01"
 CACHE_FOLDER = "./cache/W3L01"  # Directory for cache files
-CACHE_ENABLED = False  # Toggle caching
+CACHE_ENABLED = True  # Toggle caching
+KEYWORDS_PROMPT_VERSION = "v2"  # Bump when the keyword prompt changes to invalidate cached keywords
+MAX_WORKERS = 5  # Concurrent keyword requests
+FACTS_FOLDER = "fakty"
+ENTITY_INDEX_FILE = os.path.join(CACHE_FOLDER, "entity_index.json")
+FACT_SNIPPET_MAX_CHARS = 1500  # Upper bound of fact snippets added to a single keyword prompt
+STEM_LENGTH = 6  # Prefix length used to match inflected Polish names
+
+FIRST_NAMES = {
+    "adam", "agnieszka", "aleksander", "aleksandra", "andrzej", "anna", "azazel", "barbara",
+    "beata", "dariusz", "ewa", "grzegorz", "jacek", "jan", "joanna", "józef", "katarzyna",
+    "krzysztof", "łukasz", "magdalena", "małgorzata", "marek", "maria", "michał", "monika",
+    "paweł", "piotr", "rafał", "robert", "stanisław", "tomasz", "wojciech", "zofia", "zygfryd",
+}
+FIRST_NAME_STEMS = {name[:4] for name in FIRST_NAMES}
+NAME_PATTERN = re.compile(r"\b([A-ZŁŚŻŹĆŃÓĄĘ][a-ząćęłńóśźż]+)(?=\s+([A-ZŁŚŻŹĆŃÓĄĘ][a-ząćęłńóśźż]+))")
+# Only "sektor" is case-insensitive; the sector letter must be upper-case, or ordinary words would match
+SECTOR_PATTERN = re.compile(r"(?i:sektor(?:ze|a|u|em)?)[\s_-]*([A-Z]\d?)\b")
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]?")
+PARAGRAPH_PATTERN = re.compile(r"(?:[^\n]+\n?)+")
+
+KEYWORDS_SYSTEM_PROMPT = """Jestes asystentem generujacym slowa kluczowe w formie mianownika do pomocy w kategoryzacji dokumentow tekstowych.
+                 Wszystkie slowa kluczowe powinny byc oddzielone przecinkami, unikaj dodawania nowych znacznikow nowej linii. 
+                 Pierwsze slowo klucz MUSI byc nazwą sektora/działu wyciągniętą z nazwy pliku w formacie na przykalad 'sektor X1', 'sektor X2' itp.. 
+                 Zwroc uwage na osoby (jeśli podane) - kim jest, czym się zajmuje (bardzo konkretnie), 
+                 gdzie mieszka oraz inne istotne szczegóły. Jezeli znajdziesz osobe wyciagnij dla niej slowa kluczowe"""
 
 api_key = get_api_key()
 openai.api_key = get_open_api_key()
 
 def download_and_extract_zip(url: str, extraction_path: str):
-    """Download and extract a ZIP file."""
+    """Fetch the ZIP through the shared artifact store and extract only what changed."""
     try:
-        print("Downloading ZIP file...")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        zip_path = os.path.join(extraction_path, "files.zip")
-        os.makedirs(extraction_path, exist_ok=True)
-
-        with open(zip_path, "wb") as zip_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                zip_file.write(chunk)
-
-        print("Extracting ZIP file...")
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(extraction_path)
-        print("Files extracted successfully.")
+        fetch_and_extract(url, extraction_path)
     except requests.exceptions.RequestException as e:
         print(f"Error downloading ZIP file: {e}")
         raise
@@ -66,7 +83,89 @@ def save_cache(file_path: str, data: Dict):
     except Exception as e:
         print(f"Failed to save cache: {e}")
 
-def generate_keywords(text: str, cache_path: Path) -> str:
+def extract_entities(text: str) -> Set[str]:
+    """Extract person and sector entities from text with regexes and the first-name dictionary."""
+    entities = set()
+    for first, surname in NAME_PATTERN.findall(text):
+        if first.lower()[:4] in FIRST_NAME_STEMS:
+            entities.add(f"person:{first.lower()[:4]} {surname.lower()[:STEM_LENGTH]}")
+    for sector in SECTOR_PATTERN.findall(text):
+        entities.add(f"sector:{sector.upper()}")
+    return entities
+
+def load_entity_index() -> Dict[str, dict]:
+    """Load the per-file entity index from disk."""
+    if not os.path.exists(ENTITY_INDEX_FILE):
+        return {}
+    try:
+        with open(ENTITY_INDEX_FILE, "r", encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except Exception as e:
+        print(f"Failed to load entity index: {e}")
+        return {}
+
+def update_entity_index(extraction_path: str) -> Dict[str, dict]:
+    """Index entities of reports and facts files, re-reading only files whose size or mtime changed."""
+    files_index = load_entity_index()
+    paths = sorted(Path(extraction_path).glob("*.txt")) + sorted((Path(extraction_path) / FACTS_FOLDER).glob("*.txt"))
+    current = {str(path): path for path in paths}
+    changed = False
+
+    for key in list(files_index):
+        if key not in current:
+            del files_index[key]
+            changed = True
+
+    for key, path in current.items():
+        stat = path.stat()
+        entry = files_index.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue
+        text = path.read_text(encoding="utf-8")
+        # Reports carry their sector in the file name
+        entities = extract_entities(text) | extract_entities(path.name.replace("_", " "))
+        files_index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "entities": sorted(entities)}
+        changed = True
+
+    if changed:
+        os.makedirs(os.path.dirname(ENTITY_INDEX_FILE), exist_ok=True)
+        with open(ENTITY_INDEX_FILE, "w", encoding="utf-8") as index_file:
+            json.dump(files_index, index_file, indent=4, ensure_ascii=False)
+        print(f"Updated entity index for {len(files_index)} files.")
+    return files_index
+
+def build_inverted_index(files_index: Dict[str, dict]) -> Dict[str, List[str]]:
+    """Map each entity to the facts documents that mention it."""
+    inverted = {}
+    for path, entry in files_index.items():
+        if Path(path).parent.name != FACTS_FOLDER:
+            continue
+        for entity in entry["entities"]:
+            inverted.setdefault(entity, []).append(path)
+    return inverted
+
+def fact_snippets(report_entities: List[str], inverted_index: Dict[str, List[str]]) -> str:
+    """Collect the parts of matching facts documents that mention the report's entities.
+
+    Person matches contribute the whole paragraph (facts describe one person per
+    paragraph), sector matches only the mentioning sentence.
+    """
+    snippets, total = [], 0
+    for entity in sorted(report_entities, key=lambda e: not e.startswith("person:")):
+        pattern = PARAGRAPH_PATTERN if entity.startswith("person:") else SENTENCE_PATTERN
+        for path in inverted_index.get(entity, []):
+            text = Path(path).read_text(encoding="utf-8")
+            for snippet in pattern.findall(text):
+                snippet = snippet.strip()
+                if not snippet or snippet in snippets or entity not in extract_entities(snippet):
+                    continue
+                if total + len(snippet) > FACT_SNIPPET_MAX_CHARS:
+                    return "\n".join(snippets)
+                snippets.append(snippet)
+                total += len(snippet)
+    return "\n".join(snippets)
+
+def generate_keywords(text: str, cache_path: Path, file_name: str = "", facts: str = "") -> str:
     """Generate keywords for a given text using OpenAI, with caching."""
     if CACHE_ENABLED and cache_path.exists():
         print(f"Using cached keywords for {cache_path.name}")
@@ -77,13 +176,12 @@ def generate_keywords(text: str, cache_path: Path) -> str:
         response = openai.ChatCompletion.create(
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": """Jestes asystentem generujacym slowa kluczowe w formie mianownika do pomocy w kategoryzacji dokumentow tekstowych.
-                 Wszystkie slowa kluczowe powinny byc oddzielone przecinkami, unikaj dodawania nowych znacznikow nowej linii. 
-                 Pierwsze slowo klucz MUSI byc nazwą sektora/działu wyciągniętą z nazwy pliku w formacie na przykalad 'sektor X1', 'sektor X2' itp.. 
-                 Zwroc uwage na osoby (jeśli podane) - kim jest, czym się zajmuje (bardzo konkretnie), 
-                 gdzie mieszka oraz inne istotne szczegóły. Jezeli znajdziesz osobe wyciagnij dla niej slowa kluczowe"""},
-                {"role": "user", "content": f"Wybierz slowa kluczowe z ponizszego tekstu:\n\n{text}"}
-                
+                {"role": "system", "content": KEYWORDS_SYSTEM_PROMPT},
+                {"role": "user", "content": (
+                    f"Nazwa pliku: {file_name}\n\n"
+                    f"Powiazane fakty:\n{facts or 'brak'}\n\n"
+                    f"Wybierz slowa kluczowe z ponizszego tekstu:\n\n{text}"
+                )}
             ],
             temperature=0.3,
             max_tokens=300
@@ -91,32 +189,54 @@ def generate_keywords(text: str, cache_path: Path) -> str:
         keywords = response.choices[0].message["content"].strip()
         if CACHE_ENABLED:
             os.makedirs(cache_path.parent, exist_ok=True)
-            with open(cache_path, "w", encoding="utf-8") as file:
+            # A temp file per writer: reports with identical content may be written concurrently
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_path.parent,
+                                             suffix=".tmp", delete=False) as file:
                 file.write(keywords)
+            os.replace(file.name, cache_path)
         return keywords
     except Exception as e:
         print(f"Error generating keywords: {e}")
         return "Error generating keywords"
 
+def keywords_cache_path(text: str, facts: str = "", file_name: str = "") -> Path:
+    """Cache path for keywords, keyed by prompt version and a hash of the whole prompt input.
+
+    The file name is part of the prompt (it carries the date and sector), so it is part of the key.
+    """
+    content_hash = hashlib.sha256(f"{file_name}\0{text}\0{facts}".encode("utf-8")).hexdigest()
+    return Path(CACHE_FOLDER) / KEYWORDS_PROMPT_VERSION / f"{content_hash}.cache"
+
+def process_txt_file(txt_file: Path, files_index: Dict[str, dict], inverted_index: Dict[str, List[str]]) -> str:
+    """Generate keywords for a single TXT file."""
+    try:
+        with open(txt_file, "r", encoding="utf-8") as file:
+            text_content = file.read()
+        facts = fact_snippets(files_index[str(txt_file)]["entities"], inverted_index)
+        return generate_keywords(text_content, keywords_cache_path(text_content, facts, txt_file.name), txt_file.name, facts)
+    except Exception as e:
+        print(f"Error processing file {txt_file.name}: {e}")
+        return "Error processing file"
+
 def process_txt_files(extraction_path: str) -> Dict[str, str]:
-    """Process TXT files and generate keywords."""
+    """Process all TXT files concurrently and generate keywords."""
     keywords_dict = {}
-    txt_files = list(Path(extraction_path).glob("*.txt"))
-    print(f"Found {len(txt_files)} TXT files. Processing up to 10 files...")
-
-    for txt_file in txt_files[:10]:  # Limit to 10 files
-        print(f"Processing file: {txt_file.name}")
-        try:
-            cache_path = Path(CACHE_FOLDER) / f"{txt_file.name}.cache"
-            with open(txt_file, "r", encoding="utf-8") as file:
-                text_content = file.read()
-            keywords = generate_keywords(text_content, cache_path)
-            keywords_dict[txt_file.name] = keywords
-        except Exception as e:
-            print(f"Error processing file {txt_file.name}: {e}")
-            keywords_dict[txt_file.name] = "Error processing file"
-
-    return keywords_dict
+    txt_files = sorted(Path(extraction_path).glob("*.txt"))
+    files_index = update_entity_index(extraction_path)
+    inverted_index = build_inverted_index(files_index)
+    print(f"Found {len(txt_files)} TXT files. Processing with {MAX_WORKERS} workers...")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(process_txt_file, txt_file, files_index, inverted_index): txt_file
+            for txt_file in txt_files
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            txt_file = futures[future]
+            keywords_dict[txt_file.name] = future.result()
+            print(f"[{done}/{len(txt_files)}] Processed file: {txt_file.name}")
+
+    return dict(sorted(keywords_dict.items()))
 
 def send_report(data: Dict[str, str]):
     """Send the generated report to the API."""
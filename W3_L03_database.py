@@ -1,9 +1,13 @@
 import os
+import re
 import json
+import hashlib
 import requests
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 import openai
+import apidb_mirror
+from apidb_client import ApiDbClient
 
 # Configuration
 CENTRALA_API = "https://centrala.ag3nts.org/report"
@@ -11,6 +15,7 @@ TASK_ID = "database"
 USE_CACHE = True  # Enable caching to prevent re-generating the query
 CACHE_FOLDER = "./cache/W3L03"
 DATABASE_API = "https://centrala.ag3nts.org/apidb"
+USE_MIRROR = True  # Answer read-only queries from the local mirror (python apidb_mirror.py)
 
 # API keys
 api_key = get_api_key()
@@ -19,45 +24,70 @@ openai.api_key = get_open_api_key()
 # Ensure cache folder exists
 os.makedirs(CACHE_FOLDER, exist_ok=True)
 
-# Function to run query against DATABASE_API
+# Shared apidb client: local mirror, memoized read-only results, coalesced requests
+db_client = ApiDbClient(api_key, task=TASK_ID, use_mirror=USE_MIRROR)
+
+# Function to run query against the local mirror (if available) or DATABASE_API
 def run_query(query):
-    payload = {
-        "task": TASK_ID,
-        "apikey": api_key,
-        "query": query
-    }
-    response = requests.post(DATABASE_API, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to execute query '{query}': {response.text}")
+    return db_client.run_query(query)
+
+STEM_LENGTH = 5  # Prefix length used to match question words against table/column names
+COLUMN_PATTERN = re.compile(r"^\s*`(\w+)`\s+([^\s,]+)", re.MULTILINE)
+
+# Extract the CREATE TABLE statement from a "show create table" reply
+def create_statement(structure):
+    rows = structure.get("reply", []) if isinstance(structure, dict) else []
+    return rows[0].get("Create Table", "") if rows else ""
+
+# Hash of the full schema, so cached SQL is invalidated when any table changes
+def schema_hash(table_structures):
+    canonical = json.dumps({table: create_statement(s) for table, s in table_structures.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def name_stems(name):
+    # Very short parts such as "id" or "is" would match nearly every table
+    return {part[:STEM_LENGTH] for part in re.split(r"[^a-z0-9]+", name.lower()) if len(part) > 2}
+
+# Keep only the tables and columns relevant to the question
+def prune_schema(table_structures, question):
+    question_stems = name_stems(question)
+    pruned = {}
+    for table, structure in table_structures.items():
+        columns = COLUMN_PATTERN.findall(create_statement(structure))
+        table_match = bool(name_stems(table) & question_stems)
+        matching = [(name, col_type) for name, col_type in columns if name_stems(name) & question_stems]
+        if not table_match and not matching:
+            continue
+        # Keep identifier columns too, they are needed to join the pruned tables
+        pruned[table] = [
+            (name, col_type) for name, col_type in columns
+            if (name, col_type) in matching or name == "id" or name.endswith("_id")
+        ]
 
-# Fetch table structures from the API
-def fetch_table_structure(table_name):
-    print(f"Fetching structure for table: {table_name}")
-    payload = {
-        "task": TASK_ID,
-        "apikey": api_key,
-        "query": "show create table "+table_name
-    }
-    response = requests.post(DATABASE_API, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Error fetching table structure for {table_name}: {response.text}")
+    if not pruned:
+        print("No tables matched the question, sending the full schema")
+        pruned = {table: COLUMN_PATTERN.findall(create_statement(s)) for table, s in table_structures.items()}
+    print(f"Schema pruned to tables: {list(pruned)}")
+    return "\n".join(
+        f"{table}({', '.join(f'{name} {col_type}' for name, col_type in columns)})"
+        for table, columns in pruned.items()
+    )
 
 # Generate SQL query using LLM
 def generate_sql_query(table_structures, question):
-    cache_path = os.path.join(CACHE_FOLDER, "generated_query.json")
+    key = hashlib.sha256(f"{question}\0{schema_hash(table_structures)}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(CACHE_FOLDER, f"generated_query_{key[:16]}.json")
     if USE_CACHE and os.path.exists(cache_path):
-        print("Using cached SQL query")
         with open(cache_path, "r") as cache_file:
-            return json.load(cache_file)
+            cached = json.load(cache_file)
+        if cached.get("key") == key and cached.get("question") == question:
+            print("Using cached SQL query")
+            return cached["sql"]
 
     print("Generating SQL query using LLM")
     prompt = (
-        "Based on the structures of the following tables:\n\n"
-        f"{json.dumps(table_structures, indent=2)}\n\n"
+        "Based on the structures of the following tables (table(column type, ...)):\n\n"
+        f"{prune_schema(table_structures, question)}\n\n"
         f"Write an SQL query to answer the question:\n'{question}'"
     )
     response = openai.ChatCompletion.create(
@@ -69,10 +99,10 @@ def generate_sql_query(table_structures, question):
     )
     sql_query = response["choices"][0]["message"]["content"].strip()
 
-    # Cache the query
+    # Cache the query together with the question it answers
     if USE_CACHE:
         with open(cache_path, "w") as cache_file:
-            json.dump(sql_query, cache_file)
+            json.dump({"key": key, "question": question, "sql": sql_query}, cache_file)
 
     return sql_query
 
@@ -101,13 +131,19 @@ def main():
         print(f"Tables found: {table_names}")
 
         # Step 2: Fetch table structures
-        table_structures = {table: fetch_table_structure(table) for table in table_names}
+        table_structures = db_client.fetch_table_structures(table_names)
 
         # Step 3: Generate SQL query using LLM
         question = "Which active datacenters (DC_ID) are managed by employees who are on leave (is_active=0)?"
         sql_query = generate_sql_query(table_structures, question)
         print(f"Generated SQL query:\n{sql_query}")
 
+        # Fail fast on broken SQL before spending a remote call
+        if USE_MIRROR:
+            dry_run_error = apidb_mirror.dry_run(sql_query)
+            if dry_run_error:
+                raise Exception(f"Generated SQL failed the local dry-run: {dry_run_error}")
+
         # Step 4: Execute the SQL query
         query_result = run_query(sql_query)
         print(query_result)
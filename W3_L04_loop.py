@@ -4,6 +4,11 @@ import requests
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 import openai
+from apidb_client import ApiDbClient
+from polish_gazetteer import (
+    NAME_TRIE, SURNAME_PATTERN, MASCULINE_SURNAME_PATTERN, FEMININE_SURNAME_PATTERN,
+    CAPITALIZED_WORD_PATTERN, fold_diacritics
+)
 
 # Configuration
 CENTRALA_API = "https://centrala.ag3nts.org/report"
@@ -23,17 +28,15 @@ openai.api_key = get_open_api_key()
 os.makedirs(CACHE_FOLDER, exist_ok=True)
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
+# Shared query clients: repeated names/cities are memoized and concurrent duplicates coalesced
+query_clients = {
+    URL_PEOPLE: ApiDbClient(api_key, url=URL_PEOPLE),
+    URL_PLACES: ApiDbClient(api_key, url=URL_PLACES),
+}
+
 # Function to run query against a given URL (e.g., people or places)
 def run_query(url, query):
-    payload = {
-        "apikey": api_key,
-        "query": query
-    }
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to execute query '{query}': {response.text}, for url: {url}")
+    return query_clients[url].run_query(query)
     
 # Fetch text from URL_BARBARA
 def fetch_text_from_barbara():
@@ -44,46 +47,85 @@ def fetch_text_from_barbara():
     else:
         raise Exception(f"Failed to fetch text from {URL_BARBARA}: {response.text}")
 
-# Function to extract Polish nominative names using OpenAI
-def extract_polish_names(text):
-    cache_path = os.path.join(CACHE_FOLDER, "polish_names.txt")
-    
-    # Only use the cached result if USE_CACHE is True and the cache exists
-    if USE_CACHE and os.path.exists(cache_path):
-        print("Using cached Polish names")
-        with open(cache_path, "r") as cache_file:
-            names_list = [name.strip() for name in cache_file.readlines() if name.strip()]
-        return names_list
-    
+
+def pick_by_surname_gender(matches, surname):
+    """Choose between ambiguous nominatives (ALEKSANDRA/ALEKSANDER) using the following surname."""
+    if MASCULINE_SURNAME_PATTERN.search(surname):
+        preferred = [name for name in matches if not name.endswith("A")]
+    elif FEMININE_SURNAME_PATTERN.search(surname):
+        preferred = [name for name in matches if name.endswith("A")]
     else:
-        print("Extracting Polish nominative names using LLM...")
-        prompt = (
-            "Extract all Polish names in the nominative form from the following text:\n\n"
-            f"{text}\n\n"
-            "Provide the names as a list in nominative form."
-        )
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert in identifying Polish names. Return only the names in capital letters without surname in the nominative form and polish characters. Return it in pure python list without any comments."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        # Extracted names as a string, now we split them into a list
-        names = response["choices"][0]["message"]["content"].strip()
-        
-        # Clean and format names properly by removing unwanted quotes and splitting based on commas
-        names_list = [name.strip().replace('"', '').replace('[', '').replace(']', '').replace("'", "").replace('Ł', 'L') for name in names.split(",") if name.strip()]
-        print(f"Cleaned names: {names_list}")
-        
-        # Save the names to the cache file as plain text
-        with open(cache_path, "w") as cache_file:
-            for name in names_list:
-                cache_file.write(f"{name}\n")
-            
-        return names_list
+        preferred = []
+    return (preferred or matches)[0]
+
+
+def extract_polish_names_locally(text):
+    """Return (nominative names, unresolved candidates) found with the lexicon trie."""
+    names, unresolved = [], []
+    words = CAPITALIZED_WORD_PATTERN.findall(text)
+    for index, word in enumerate(words):
+        folded = fold_diacritics(word.upper())
+        following = fold_diacritics(words[index + 1].upper()) if index + 1 < len(words) else ""
+        matches = NAME_TRIE.match(folded)
+        if matches:
+            nominative = pick_by_surname_gender(matches, following)
+            if nominative not in names:
+                names.append(nominative)
+            continue
+        # An unknown capitalized word followed by a surname is probably a first name outside the lexicon
+        if following and SURNAME_PATTERN.search(following) and not NAME_TRIE.match(following):
+            if word not in unresolved:
+                unresolved.append(word)
+    return names, unresolved
+
+
+# Function to extract Polish nominative names using OpenAI (fallback for names outside the lexicon)
+def extract_polish_names_with_llm(text, candidates):
+    cache_path = os.path.join(CACHE_FOLDER, "polish_names_llm.json")
+    cache_key = ",".join(sorted(candidates))
+    cache = {}
+    if USE_CACHE and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+        if cache_key in cache:
+            print("Using cached LLM names")
+            return cache[cache_key]
+
+    print(f"Resolving {len(candidates)} names outside the lexicon using LLM...")
+    prompt = (
+        "Extract all Polish names in the nominative form from the following text:\n\n"
+        f"{text}\n\n"
+        f"Consider only these words: {', '.join(candidates)}.\n"
+        "Provide the names as a list in nominative form."
+    )
+
+    response = openai.ChatCompletion.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are an expert in identifying Polish names. Return only the names in capital letters without surname in the nominative form and polish characters. Return it in pure python list without any comments."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+
+    names = response["choices"][0]["message"]["content"].strip()
+    names_list = [fold_diacritics(name.strip(" \"'[]")) for name in names.split(",") if name.strip(" \"'[]")]
+
+    if USE_CACHE:
+        cache[cache_key] = names_list
+        with open(cache_path, "w", encoding="utf-8") as cache_file:
+            json.dump(cache, cache_file, ensure_ascii=False)
+    return names_list
+
+# Function to extract Polish nominative names, locally with LLM fallback
+def extract_polish_names(text):
+    names_list, unresolved = extract_polish_names_locally(text)
+    print(f"Names from lexicon: {names_list}")
+    if unresolved:
+        print(f"Names outside the lexicon: {unresolved}")
+        for name in extract_polish_names_with_llm(text, unresolved):
+            if name not in names_list:
+                names_list.append(name)
+    return names_list
 
 # Function to send each name to URL_PEOPLE and store results
 def send_name_to_people(name):
@@ -4,6 +4,7 @@ import requests
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 import openai
+from apidb_client import ApiDbClient
 from neo4j import GraphDatabase
 
 # Configuration
@@ -13,6 +14,7 @@ TASK_ID = "connections"
 USE_CACHE = True  # Enable caching to prevent re-generating the query
 CACHE_FOLDER = "./cache/W3L05"
 DATABASE_API = "https://centrala.ag3nts.org/apidb"
+USE_MIRROR = True  # Answer read-only queries from the local mirror (python apidb_mirror.py)
 
 # API keys
 api_key = get_api_key()
@@ -21,18 +23,12 @@ openai.api_key = get_open_api_key()
 # Ensure cache folder exists
 os.makedirs(CACHE_FOLDER, exist_ok=True)
 
-# Function to run query against DATABASE_API
+# Shared apidb client: local mirror, memoized read-only results, coalesced requests
+db_client = ApiDbClient(api_key, task=DB_TASK_ID, use_mirror=USE_MIRROR)
+
+# Function to run query against the local mirror (if available) or DATABASE_API
 def run_query(query):
-    payload = {
-        "task": DB_TASK_ID,
-        "apikey": api_key,
-        "query": query
-    }
-    response = requests.post(DATABASE_API, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to execute query '{query}': {response.text}")
+    return db_client.run_query(query)
 
 def setup_neo4j_database(users, connections):
     """Setup Neo4j database with users and their connections"""
@@ -4,16 +4,28 @@ import requests
 from get_api_key import get_api_key
 from get_open_api_key import get_open_api_key
 import openai
-import base64
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
-from typing import Dict, Optional
+from typing import Optional
+from kv_store import KVStore
+from photo_quality import assess_photo
+from vision_batch import image_parts, pack_batches, batch_content, batch_verdicts
 
 # Configuration
 CENTRALA_API = "https://centrala.ag3nts.org/report"
 TASK_ID = "photos"
 USE_CACHE = True  # Enable caching to prevent re-generating the query
 CACHE_FOLDER = "./cache/W4L01"
+MAX_CORRECTION_ROUNDS = 3  # REPAIR/DARKEN/BRIGHTEN round-trips allowed per photo
+MAX_PHOTO_WORKERS = 4
+CORRECTION_COMMANDS = ("REPAIR", "DARKEN", "BRIGHTEN")
+DEFAULT_IMAGE_BASE_URL = "https://centrala.ag3nts.org/dane/barbara"
+IMAGE_FILENAME_PATTERN = re.compile(r"\bIMG_[\w-]+\.(?:PNG|JPE?G)\b", re.IGNORECASE)
+ABSOLUTE_URL_PATTERN = re.compile(r"https?://[^\s\"'<>()\[\]]+")
+LOCAL_MIN_CONFIDENCE = 0.8  # Below this the local quality verdict is checked by the vision model
 
 # API keys
 api_key = get_api_key()
@@ -41,7 +53,7 @@ def send_api_request(payload: dict) -> dict:
     #print(f"Response: {mask_sensitive_data(result)}")
     return result
 
-def extract_urls_with_llm(message: str, base_url: str = "https://centrala.ag3nts.org/dane/barbara") -> list[str]:
+def extract_urls_with_llm(message: str, base_url: str = DEFAULT_IMAGE_BASE_URL) -> list[str]:
     """Extract image URLs from the message, combining base URL with filenames"""
     
     system_prompt = """Extract image filenames from the message. Look for patterns like IMG_*.PNG.
@@ -78,6 +90,48 @@ If no filenames found, return an empty array."""
     print(f"Extracted URLs: {urls}")
     return urls
 
+def extract_urls(message: str, base_url: str = DEFAULT_IMAGE_BASE_URL) -> list[str]:
+    """Extract image URLs with patterns, inferring the base URL from the message; LLM only as fallback"""
+    urls = []
+    for match in ABSOLUTE_URL_PATTERN.finditer(message):
+        url = match.group().rstrip(".,;:!?")
+        path = urlparse(url).path
+        if IMAGE_FILENAME_PATTERN.fullmatch(os.path.basename(path)):
+            urls.append(url)
+            base_url = url.rsplit("/", 1)[0]
+        elif not os.path.splitext(path)[1]:
+            # A directory URL such as https://centrala.ag3nts.org/dane/barbara/
+            base_url = url
+
+    known = {os.path.basename(urlparse(url).path) for url in urls}
+    for match in IMAGE_FILENAME_PATTERN.finditer(message):
+        filename = match.group()
+        if filename not in known:
+            known.add(filename)
+            urls.append(f"{base_url.rstrip('/')}/{filename}")
+
+    if not urls:
+        print("No image filenames matched, asking the LLM")
+        return extract_urls_with_llm(message, base_url)
+    print(f"Extracted URLs: {urls}")
+    return urls
+
+def corrected_url(urls: list[str], original: str, current: str) -> Optional[str]:
+    """Pick the URL of the corrected version of a photo, or None if the reply has none.
+
+    Corrections keep the original name as a prefix (IMG_559.PNG -> IMG_559_FXER.PNG); other
+    photos mentioned in the reply and the current file itself are ignored.
+    """
+    original_stem, current_stem = os.path.splitext(original)[0], os.path.splitext(current)[0]
+    candidates = [
+        url for url in urls
+        if os.path.basename(urlparse(url).path) != current
+        and os.path.basename(urlparse(url).path).startswith(original_stem + "_")
+    ]
+    # A correction of the current file beats one derived only from the original
+    candidates.sort(key=lambda url: not os.path.basename(urlparse(url).path).startswith(current_stem + "_"))
+    return candidates[0] if candidates else None
+
 def download_image(url: str, save_dir: str = 'data/photos') -> str:
     """Download image from URL and save to local directory"""
     # Add -small suffix before extension
@@ -105,101 +159,109 @@ def download_image(url: str, save_dir: str = 'data/photos') -> str:
     print(f"Downloaded image: {small_filename}")
     return save_path
 
-def load_photo_cache(cache_path: str = 'data/photos/photos.json') -> Dict:
-    """Load photo analysis cache from JSON file"""
-    try:
-        with open(cache_path, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def save_photo_cache(cache: Dict, cache_path: str = 'data/photos/photos.json'):
-    """Save photo analysis cache to JSON file"""
-    with open(cache_path, 'w') as f:
-        json.dump(cache, f, indent=2)
+def load_photo_cache(cache_path: str = 'data/photos/photos.sqlite') -> KVStore:
+    """Open the photo analysis cache, importing the legacy JSON cache on first use"""
+    return KVStore(cache_path, legacy_json_path='data/photos/photos.json')
 
-def get_cached_command(filename: str, cache: Dict) -> Optional[str]:
+def get_cached_command(filename: str, cache: KVStore) -> Optional[str]:
     """Get cached command for a photo if it exists"""
     return cache.get(filename)
 
-def encode_image_to_base64(image_path: str) -> str:
-    """Convert image to base64 string"""
-    with open(image_path, 'rb') as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+ANALYSIS_INSTRUCTIONS = """You are a photo expert looking for photos of a woman named Barbara.
+For every image report:
+- "woman": true if you see a woman in the photo, otherwise false
+- "condition": "REPAIR" if the image is completely broken (corrupted/unreadable), "DARKEN" if it is too bright,
+  "BRIGHTEN" if it is too dark, "OK" if it needs no correction"""
 
-def analyze_images_with_gpt4(image_paths: list[str]) -> str:
-    """Use GPT-4o to analyze images and check for Barbara"""
-    
-    # Get filename for commands
-    filename = os.path.basename(image_paths[0])
-    
-    messages = [
-        {
-            "role": "system",
-            "content": f"""You are a photo expert looking for photos of a woman named Barbara. 
-Analyze the provided image and:
-1. If you don't see a woman in the photo, return "SKIP"
-2. If the image is completely broken (corrupted/unreadable), return "REPAIR {filename}"
-3. If you see a woman but the photo needs correction, determine if it needs to be darkened or brightened
-   Return: "DARKEN {filename}" or "BRIGHTEN {filename}"
-4. If you see a clear photo of a woman that doesn't need corrections, return "PHOTO_OK"
-Provide only one command as response."""
-        }
-    ]
-    
-    # Process single image
-    base64_image = encode_image_to_base64(image_paths[0])
-    messages.append({
-        "role": "user",
-        "content": [
-            {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
-                }
-            },
-            {
-                "type": "text",
-                "text": f"Analyze this image ({filename}) and provide appropriate command."
-            }
-        ]
-    })
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=0.0
-    )
-    
-    command = response.choices[0].message.content.strip()
-    print(f"Analysis result: {command}")
-    return command
+def verdict_to_command(filename: str, verdict: dict, local_command: Optional[str] = None) -> str:
+    """Turn a structured per-image verdict into a centrala command
+
+    local_command is the command already decided from image statistics; then only
+    the woman question was open.
+    """
+    woman = verdict.get("woman") is True
+    if local_command:
+        return local_command if woman else "SKIP"
+    condition = str(verdict.get("condition", "")).upper()
+    if condition == "REPAIR":
+        return f"REPAIR {filename}"
+    if not woman:
+        return "SKIP"
+    if condition in ("DARKEN", "BRIGHTEN"):
+        return f"{condition} {filename}"
+    return "PHOTO_OK"
+
+def analyze_images_with_gpt4(image_paths: list[str], local_commands: Optional[dict] = None) -> dict[str, str]:
+    """Use GPT-4o to analyze images in batched requests and return a command per image path
+
+    Photos in local_commands were judged from image statistics and only need the woman check.
+    Photos without a verdict, even after a retry, are left out of the result.
+    """
+    local_commands = local_commands or {}
+    # The woman question does not need more than the low-detail view
+    items = {
+        os.path.basename(path): image_parts(path, "low" if path in local_commands else "auto")
+        for path in image_paths
+    }
+    verdicts = batch_verdicts(list(items.items()), ANALYSIS_INSTRUCTIONS)
+    missing = [filename for filename in items if filename not in verdicts]
+    if missing:
+        print(f"No verdict for {missing}, asking again")
+        verdicts.update(batch_verdicts([(filename, items[filename]) for filename in missing], ANALYSIS_INSTRUCTIONS))
 
-def analyze_photo_with_cache(image_path: str, cache: Dict) -> str:
-    """Analyze photo using cache if available, otherwise use GPT-4"""
+    commands = {}
+    for path in image_paths:
+        filename = os.path.basename(path)
+        verdict = verdicts.get(filename)
+        if verdict is None:
+            print(f"Analysis failed for {filename}")
+            continue
+        commands[path] = verdict_to_command(filename, verdict, local_commands.get(path))
+        print(f"Analysis result for {filename}: {commands[path]}")
+    return commands
+
+def analyze_photo_locally(image_path: str) -> Optional[str]:
+    """Judge photo quality from image statistics: a command, or None when the model has to decide"""
     filename = os.path.basename(image_path)
-    
-    # Check cache first
-    cached_command = get_cached_command(filename, cache)
-    if cached_command:
-        print(f"Using cached analysis for {filename}: {cached_command}")
-        return cached_command
-    
-    # If not in cache, analyze with GPT-4
-    command = analyze_images_with_gpt4([image_path])
-    
-    # Update cache
-    cache[filename] = command
-    save_photo_cache(cache)
-    
-    return command
+    verdict, confidence, _ = assess_photo(image_path)
+    print(f"Local analysis for {filename}: {verdict} (confidence {confidence:.2f})")
+    # A broken photo cannot be checked for a woman, so REPAIR is left to the full model verdict
+    if confidence < LOCAL_MIN_CONFIDENCE or verdict == "REPAIR":
+        return None
+    return "PHOTO_OK" if verdict == "OK" else f"{verdict} {filename}"
 
-def generate_description(image_paths: list[str]) -> str:
-    """Generate final description of Barbara using GPT-4 Vision"""    
-    messages = [
-        {
-            "role": "system",
-            "content": """Twoim zadaniem jest stworzenie szczegółowego opisu postaci widocznej na załączonych ilustracjach. 
+def analyze_photos_with_cache(image_paths: list[str], cache: KVStore) -> dict[str, str]:
+    """Analyze photos using the cache, then local statistics, then one batched GPT-4o pass"""
+    commands, pending, local_commands = {}, [], {}
+    for image_path in image_paths:
+        filename = os.path.basename(image_path)
+        cached_command = get_cached_command(filename, cache)
+        if cached_command:
+            print(f"Using cached analysis for {filename}: {cached_command}")
+            commands[image_path] = cached_command
+            continue
+        pending.append(image_path)
+        local = analyze_photo_locally(image_path)
+        if local is not None:
+            # Quality is settled locally; only the model can tell whether the photo shows a woman
+            local_commands[image_path] = local
+
+    if pending:
+        analyzed = analyze_images_with_gpt4(pending, local_commands)
+        for image_path in pending:
+            if image_path in analyzed:
+                commands[image_path] = analyzed[image_path]
+                cache.put(os.path.basename(image_path), analyzed[image_path])
+            else:
+                # No verdict is not a verdict: skip the photo this run, but ask again next time
+                commands[image_path] = "SKIP"
+    return commands
+
+def analyze_photo_with_cache(image_path: str, cache: KVStore) -> str:
+    """Analyze a single photo using cache if available, then local statistics, then GPT-4o"""
+    return analyze_photos_with_cache([image_path], cache)[image_path]
+
+DESCRIPTION_PROMPT = """Twoim zadaniem jest stworzenie szczegółowego opisu postaci widocznej na załączonych ilustracjach. 
 Skup się tylko na postaci pojawiającej się na większości ilustracji.
 Zwróć uwagę na:
 1. Dokładny kolor włosów (bądź bardzo precyzyjny co do odcienia)
@@ -208,39 +270,175 @@ Zwróć uwagę na:
 4. Ubranies
 
 Bądź bardzo precyzyjny i szczegółowy. Odpowiedz w języku polskim podając jedynie opis bez zbędnych komentarzy."""
-        }
-    ]
-    
-    # Add each image to the messages
-    for image_path in image_paths:
-        base64_image = encode_image_to_base64(image_path)
-        messages.append({
-            "role": "user",
-            "content": [
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}"
-                    }
-                }
-            ]
-        })
-    
-    print("\n" + "=" * 80)
-    print("LLM Request for description:")
-    print(messages[0]["content"])
-    print("=" * 80 + "\n")
-    
+
+def describe_batch(batch: list) -> str:
+    """Describe the person shown on one batch of images in a single request"""
     response = openai.ChatCompletion.create(
         model="gpt-4o",
-        messages=messages,
+        messages=[
+            {
+                "role": "system",
+                "content": DESCRIPTION_PROMPT
+            },
+            {
+                "role": "user",
+                "content": batch_content(batch)
+            }
+        ],
         temperature=0.0
     )
+    return response.choices[0].message.content.strip()
+
+def generate_description(image_paths: list[str]) -> str:
+    """Generate final description of Barbara using GPT-4 Vision"""    
+    # Hair colour and small marks need the high-detail view; oversized photos are tiled or downscaled
+    items = [(os.path.basename(path), image_parts(path, "high")) for path in image_paths]
+    batches = pack_batches(items)
+    
+    print("\n" + "=" * 80)
+    print(f"LLM Request for description ({len(items)} images in {len(batches)} requests):")
+    print(DESCRIPTION_PROMPT)
+    print("=" * 80 + "\n")
+    
+    if len(batches) == 1:
+        description = describe_batch(batches[0])
+    else:
+        # Too many images for one request: describe each batch, then merge the partial descriptions
+        with ThreadPoolExecutor(max_workers=min(len(batches), MAX_PHOTO_WORKERS)) as executor:
+            partial = list(executor.map(describe_batch, batches))
+        response = openai.ChatCompletion.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": DESCRIPTION_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": "Połącz poniższe opisy tej samej osoby w jeden spójny opis:\n\n" + "\n\n".join(partial)
+                }
+            ],
+            temperature=0.0
+        )
+        description = response.choices[0].message.content.strip()
     
-    description = response.choices[0].message.content.strip()
     print(f"Generated description:\n{description}")
     return description
 
+class PhotoRepairJob:
+    """Per-photo state machine: download -> analyze -> command -> extract URL -> download -> ...
+
+    Runs until the photo is OK, skipped, out of correction rounds or out of URLs,
+    recording how long each step took.
+    """
+
+    def __init__(self, url: str, cache: KVStore, max_rounds: int = MAX_CORRECTION_ROUNDS,
+                 image_path: Optional[str] = None):
+        self.url = url
+        self.cache = cache
+        self.max_rounds = max_rounds
+        self.name = os.path.basename(urlparse(url).path)
+        self.state = "analyze" if image_path else "download"
+        self.rounds = 0
+        self.image_path: Optional[str] = image_path
+        self.command: Optional[str] = None
+        self.message = ""
+        self.result: Optional[str] = None
+        self.outcome = "pending"
+        self.timings: list[tuple[str, float]] = []
+
+    def download(self) -> str:
+        self.image_path = download_image(self.url)
+        return "analyze"
+
+    def analyze(self) -> str:
+        self.command = analyze_photo_with_cache(self.image_path, self.cache)
+        if self.command == "PHOTO_OK":
+            print(f"Found good photo: {self.image_path}")
+            self.result = self.image_path
+            self.outcome = "ok"
+            return "done"
+        if not self.command.startswith(CORRECTION_COMMANDS):
+            self.outcome = self.command.lower()
+            return "done"
+        if self.rounds >= self.max_rounds:
+            print(f"{self.name}: giving up after {self.rounds} correction rounds")
+            self.outcome = "out of rounds"
+            return "done"
+        return "command"
+
+    def send_command(self) -> str:
+        self.rounds += 1
+        response = send_api_request({
+            "task": TASK_ID,
+            "apikey": api_key,
+            "answer": self.command
+        })
+        self.message = response.get('message', '')
+        return "extract"
+
+    def extract(self) -> str:
+        current = os.path.basename(urlparse(self.url).path)
+        new_url = corrected_url(extract_urls(self.message), self.name, current)
+        if new_url is None:
+            self.outcome = "no corrected URL"
+            return "done"
+        self.url = new_url
+        return "download"
+
+    def run(self) -> Optional[str]:
+        """Drive the photo to a final state; returns the path of a good photo or None."""
+        handlers = {
+            "download": self.download,
+            "analyze": self.analyze,
+            "command": self.send_command,
+            "extract": self.extract,
+        }
+        while self.state != "done":
+            state, start = self.state, time.perf_counter()
+            try:
+                self.state = handlers[state]()
+            except Exception as e:
+                print(f"{self.name}: error in {state}: {e}")
+                self.outcome = f"error in {state}"
+                self.state = "done"
+            self.timings.append((state, time.perf_counter() - start))
+        return self.result
+
+    @property
+    def total_time(self) -> float:
+        return sum(seconds for _, seconds in self.timings)
+
+def report_timings(jobs: list[PhotoRepairJob], wall_time: float) -> None:
+    """Print per-photo step timings and compare the wall time with running the chains in series."""
+    for job in jobs:
+        steps = ", ".join(f"{state} {seconds:.2f}s" for state, seconds in job.timings)
+        print(f"{job.name}: {job.outcome} after {job.rounds} rounds, {job.total_time:.2f}s ({steps})")
+    serial_time = sum(job.total_time for job in jobs)
+    slowest = max((job.total_time for job in jobs), default=0.0)
+    print(f"Wall time {wall_time:.2f}s, slowest photo {slowest:.2f}s, sum of all chains {serial_time:.2f}s")
+
+def prefetch_photos(urls: list[str], cache: KVStore) -> list[Optional[str]]:
+    """Download the initial photos concurrently and analyze them together in batched vision requests.
+
+    Returns the local path per URL, None where the download failed (the job then retries it).
+    """
+    def try_download(url: str) -> Optional[str]:
+        try:
+            return download_image(url)
+        except Exception as e:
+            print(f"Prefetch of {url} failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(len(urls), MAX_PHOTO_WORKERS)) as executor:
+        image_paths = list(executor.map(try_download, urls))
+    try:
+        analyze_photos_with_cache([path for path in image_paths if path], cache)
+    except Exception as e:
+        # The jobs analyze their photos one by one instead
+        print(f"Batched analysis failed: {e}")
+    return image_paths
+
 # Main function
 def main():
     try:
@@ -256,37 +454,21 @@ def main():
         Path('data/photos').mkdir(parents=True, exist_ok=True)
         
         # Extract all URLs from initial message
-        urls = extract_urls_with_llm(response.get('message', ''))
+        urls = extract_urls(response.get('message', ''))
         print(urls)
         if not urls:
             print("No URLs found in the message")
             exit(1)
         
-        good_photos = []
+        start = time.perf_counter()
+        image_paths = prefetch_photos(urls, photo_cache)
         
-        for url in urls:
-            # Download and analyze each image
-            image_path = download_image(url)
-            command = analyze_photo_with_cache(image_path, photo_cache)
-            
-            if command == "PHOTO_OK":
-                print(f"Found good photo: {image_path}")
-                good_photos.append(image_path)
-            elif command.startswith(("REPAIR", "DARKEN", "BRIGHTEN")):
-                # Send correction command and process the response
-                response = send_api_request({
-                    "task": TASK_ID,
-                    "apikey": api_key,
-                    "answer": command
-                })
-                # Extract and process the corrected image
-                new_urls = extract_urls_with_llm(response.get('message', ''))
-                if new_urls:
-                    corrected_image = download_image(new_urls[0])
-                    new_command = analyze_photo_with_cache(corrected_image, photo_cache)
-                    if new_command == "PHOTO_OK":
-                        print(f"Found good photo after correction: {corrected_image}")
-                        good_photos.append(corrected_image)
+        # Run every photo's repair chain concurrently; the first analysis is served from the cache
+        jobs = [PhotoRepairJob(url, photo_cache, image_path=path) for url, path in zip(urls, image_paths)]
+        with ThreadPoolExecutor(max_workers=min(len(jobs), MAX_PHOTO_WORKERS)) as executor:
+            results = list(executor.map(lambda job: job.run(), jobs))
+        report_timings(jobs, time.perf_counter() - start)
+        good_photos = [path for path in results if path]
         
         if good_photos:
             print(f"Found {len(good_photos)} good photos, generating final description")
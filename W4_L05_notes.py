@@ -2,7 +2,6 @@ import os
 import json
 import io
 import hashlib
-import base64
 import requests
 import openai
 import PyPDF2
@@ -11,6 +10,8 @@ from get_key import get_key
 from pathlib import Path
 from typing import Dict
 from PIL import Image
+from kv_store import KVStore
+from image_payload import image_content
 
 
 # Configuration
@@ -219,11 +220,6 @@ def extract_pdf_images(pdf_path: Path, output_dir: Path) -> dict[str, str]:
 def describe_image_with_llm(client: openai, image_path: Path) -> dict:
     """Use LLM to first categorize and then describe the image"""
     try:
-        # Read image as base64
-        with open(image_path, "rb") as image_file:
-            image_data = image_file.read()
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
         # First step: Categorize image
         categorization_prompt = """Jesteś ekspertem w analizie obrazów. Twoim zadaniem jest kategoryzacja obrazu do jednej z trzech kategorii.
 
@@ -251,12 +247,8 @@ Gdzie:
                 {
                     "role": "user",
                     "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
+                        # Categorization only needs the low-detail view
+                        image_content(image_path, detail="low")
                     ]
                 }
             ],
@@ -300,12 +292,8 @@ Gdzie:
                 {
                     "role": "user",
                     "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
+                        # Transcribing text needs the high-detail view
+                        image_content(image_path, detail="high")
                     ]
                 }
             ],
@@ -329,28 +317,15 @@ Gdzie:
         print(f"Error describing image {image_path}: {str(e)}")
         return {"type": "ERROR", "error": str(e)}
 
-def load_image_descriptions_cache(cache_path: Path) -> dict[str, str]:
-    """Load existing image descriptions from cache"""
-    if cache_path.exists():
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading cache: {str(e)}")
-    return {}
-
-def save_image_descriptions_cache(cache_path: Path, descriptions: dict[str, str]) -> None:
-    """Save image descriptions to cache"""
-    try:
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(descriptions, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving cache: {str(e)}")
+def load_image_descriptions_cache(cache_path: Path) -> KVStore:
+    """Open the image descriptions cache, importing the legacy JSON cache on first use"""
+    return KVStore(cache_path, legacy_json_path=cache_path.with_suffix('.json'))
 
 def generate_image_descriptions(client: openai, image_paths: list[Path], cache_path: Path) -> dict[str, dict]:
     """Generate descriptions for each unique image using GPT-4V, using cache when available"""
-    # Load existing descriptions from cache
-    descriptions = load_image_descriptions_cache(cache_path)
+    # Open existing descriptions cache
+    cache = load_image_descriptions_cache(cache_path)
+    descriptions = dict(cache.items())
     
     for image_path in image_paths:
         image_name = image_path.name
@@ -363,13 +338,14 @@ def generate_image_descriptions(client: openai, image_paths: list[Path], cache_p
             descriptions[image_name] = result
             print(f"Generated description for {image_name}: {result}")
             
-            # Save to cache after each new description
-            save_image_descriptions_cache(cache_path, descriptions)
+            # Persist each new description in its own transaction
+            cache.put(image_name, result)
             
         except Exception as e:
             print(f"Error describing image {image_path}: {str(e)}")
             descriptions[image_name] = {"type": "ERROR", "error": str(e)}
     
+    cache.close()
     return descriptions
 
 def main():
@@ -409,7 +385,7 @@ def main():
         
         print("\n5. Generating image descriptions...")
         image_paths = [images_dir / filename for filename in image_references.values()]
-        cache_path = data_dir / "images.json"
+        cache_path = data_dir / "images.sqlite"
         image_descriptions = generate_image_descriptions(client, image_paths, cache_path)
         
         print("\n6. Extracting PDF content with image references and descriptions...")
@@ -0,0 +1,121 @@
+import os
+import re
+import unicodedata
+from collections import deque
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+from kv_store import KVStore
+
+FUZZY_THRESHOLD = 0.97  # Minimum token-set ratio for a fuzzy memo hit, when fuzzy lookup is enabled
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold diacritics, drop punctuation and collapse whitespace."""
+    text = text.lower().replace("ł", "l")
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def token_set_ratio(a: str, b: str) -> float:
+    """Similarity of two normalized texts that ignores word order and duplicated words."""
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    common = " ".join(sorted(tokens_a & tokens_b))
+    only_a = (common + " " + " ".join(sorted(tokens_a - tokens_b))).strip()
+    only_b = (common + " " + " ".join(sorted(tokens_b - tokens_a))).strip()
+    return max(
+        SequenceMatcher(None, common, only_a).ratio() if common else 0.0,
+        SequenceMatcher(None, common, only_b).ratio() if common else 0.0,
+        SequenceMatcher(None, only_a, only_b).ratio(),
+    )
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every phrase."""
+
+    def __init__(self, phrases: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        for phrase in phrases:
+            self._add(phrase)
+        self._build()
+
+    def _add(self, phrase: str) -> None:
+        state = 0
+        for char in phrase:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(phrase)
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """Return (start index, phrase) for every occurrence, in order of appearance."""
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for phrase in self.output[state]:
+                matches.append((index - len(phrase) + 1, phrase))
+        return sorted(matches)
+
+
+class AnswerMemo:
+    """Persistent question -> answer memo with exact and optional fuzzy lookup.
+
+    Lookups match the normalized question exactly unless a fuzzy_threshold
+    is given. Entries are kept in memory for lookups; the KV store is only
+    created on the first put, so reading a memo never touches the disk when
+    there is none.
+    """
+
+    def __init__(self, db_path: str, fuzzy_threshold: Optional[float] = None):
+        self.db_path = db_path
+        self.fuzzy_threshold = fuzzy_threshold
+        self._store: Optional[KVStore] = KVStore(db_path) if os.path.exists(db_path) else None
+        self.entries: Dict[str, str] = dict(self._store.items()) if self._store else {}
+
+    def get(self, question: str) -> Optional[str]:
+        """Return a remembered answer for the question, or None."""
+        key = normalize_text(question)
+        if key in self.entries:
+            return self.entries[key]
+        if self.fuzzy_threshold is None:
+            return None
+
+        # Questions that differ only by a number are different questions
+        numbers = NUMBER_PATTERN.findall(key)
+        best_answer, best_ratio = None, self.fuzzy_threshold
+        for known, answer in self.entries.items():
+            if NUMBER_PATTERN.findall(known) != numbers:
+                continue
+            ratio = token_set_ratio(key, known)
+            if ratio >= best_ratio:
+                best_answer, best_ratio = answer, ratio
+        return best_answer
+
+    def put(self, question: str, answer: str) -> None:
+        """Remember an answer that was accepted."""
+        key = normalize_text(question)
+        if self._store is None:
+            self._store = KVStore(self.db_path)
+        self._store.put(key, answer)
+        self.entries[key] = answer
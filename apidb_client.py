@@ -0,0 +1,108 @@
+import re
+import time
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+import apidb_mirror
+
+DATABASE_API = apidb_mirror.DATABASE_API
+DEFAULT_TTL = 300  # Seconds a read-only result stays memoized
+MAX_SCHEMA_WORKERS = 16
+
+READ_ONLY_PATTERN = re.compile(r"^\s*(select|with|show|describe|desc|explain)\b", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon so equivalent queries share a cache entry."""
+    return re.sub(r"\s+", " ", query.strip()).rstrip(";").strip()
+
+
+class ApiDbClient:
+    """Client for centrala query endpoints (apidb, people, places).
+
+    Read-only results are memoized by normalized query for ttl seconds and
+    identical queries issued concurrently share a single HTTP request.
+    Connections are pooled through one requests.Session.
+    """
+
+    def __init__(self, api_key: str, task: Optional[str] = None, url: str = DATABASE_API,
+                 ttl: float = DEFAULT_TTL, use_mirror: bool = False,
+                 mirror_path: str = apidb_mirror.MIRROR_PATH):
+        self.api_key = api_key
+        self.task = task
+        self.url = url
+        self.ttl = ttl
+        self.use_mirror = use_mirror
+        self.mirror_path = mirror_path
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._results: Dict[str, tuple] = {}  # normalized query -> (expires_at, result)
+        self._in_flight: Dict[str, Future] = {}
+        self.remote_calls = 0
+
+    def _remote(self, query: str) -> dict:
+        payload = {"apikey": self.api_key, "query": query}
+        if self.task:
+            payload["task"] = self.task
+        response = self.session.post(self.url, json=payload)
+        self.remote_calls += 1
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to execute query '{query}': {response.text}, for url: {self.url}")
+
+    def is_read_only(self, query: str) -> bool:
+        """Lookups on people/places are always read-only; apidb queries are checked by statement."""
+        return self.url != DATABASE_API or bool(READ_ONLY_PATTERN.match(query))
+
+    def run_query(self, query: str) -> dict:
+        """Run a query, using the mirror, the memo or an in-flight request when possible."""
+        if self.use_mirror:
+            result = apidb_mirror.local_query(query, self.mirror_path)
+            if result is not None:
+                return result
+
+        if not self.is_read_only(query):
+            return self._remote(query)
+
+        key = normalize_query(query)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._remote(query)
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def fetch_table_structures(self, table_names: List[str]) -> Dict[str, dict]:
+        """Fetch 'show create table' for all tables concurrently, in about one round-trip."""
+        if not table_names:
+            return {}
+        print(f"Fetching structures for {len(table_names)} tables concurrently...")
+        with ThreadPoolExecutor(max_workers=min(len(table_names), MAX_SCHEMA_WORKERS)) as executor:
+            structures = executor.map(lambda table: self.run_query(f"show create table {table}"), table_names)
+            return dict(zip(table_names, structures))
+
+    def clear(self) -> None:
+        """Drop all memoized results."""
+        with self._lock:
+            self._results.clear()
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+import sqlite3
+import argparse
+import requests
+from typing import Dict, List, Optional
+from get_api_key import get_api_key
+
+# Configuration
+DATABASE_API = "https://centrala.ag3nts.org/apidb"
+DB_TASK_ID = "database"
+MIRROR_PATH = "./cache/apidb_mirror.sqlite"
+PAGE_SIZE = 500  # Rows fetched per paginated SELECT while mirroring
+META_TABLE = "_mirror_tables"
+MIRROR_MAX_AGE = 24 * 3600  # Seconds before a mirrored table is considered stale and queried remotely
+
+READ_ONLY_PATTERN = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+TABLE_REFERENCE_PATTERN = re.compile(r"\b(?:from|join)\s+`?(\w+)`?", re.IGNORECASE)
+# Dry-run errors that are certain to fail remotely too, as opposed to MySQL/SQLite dialect differences
+FATAL_DRY_RUN_ERRORS = ("no such table", "no such column", "ambiguous column")
+
+
+def remote_query(query: str, api_key: str, task: str = DB_TASK_ID) -> dict:
+    """Run a query against the remote apidb."""
+    payload = {
+        "task": task,
+        "apikey": api_key,
+        "query": query
+    }
+    response = requests.post(DATABASE_API, json=payload)
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(f"Failed to execute query '{query}': {response.text}")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sqlite_type(mysql_type: str) -> str:
+    """Map a MySQL column type to the SQLite type with the same affinity."""
+    mysql_type = mysql_type.lower()
+    if "int" in mysql_type:
+        return "INTEGER"
+    if any(name in mysql_type for name in ("decimal", "numeric", "float", "double", "real")):
+        return "REAL"
+    return "TEXT"
+
+
+def mirror_database(api_key: str, mirror_path: str = MIRROR_PATH) -> Dict[str, int]:
+    """Snapshot every remote table into a local SQLite file, checking row counts."""
+    os.makedirs(os.path.dirname(os.path.abspath(mirror_path)), exist_ok=True)
+    tmp_path = mirror_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    tables_reply = remote_query("show tables", api_key).get("reply", [])
+    table_names = [list(row.values())[0] for row in tables_reply]
+    row_counts = {}
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(f"CREATE TABLE {META_TABLE} (name TEXT PRIMARY KEY, row_count INTEGER, mirrored_at REAL)")
+        for table in table_names:
+            expected = int(remote_query(f"select count(*) as cnt from {table}", api_key)["reply"][0]["cnt"])
+            print(f"Mirroring table {table} ({expected} rows)...")
+
+            # Declared types give the mirror MySQL's affinities, so "0" from the API is stored as 0
+            structure = remote_query(f"show columns from {table}", api_key).get("reply", [])
+            columns = [row["Field"] for row in structure]
+            keys = [row["Field"] for row in structure if row.get("Key") == "PRI"] or columns
+            order_by = ", ".join(f"`{column}`" for column in keys)
+
+            rows: List[dict] = []
+            offset = 0
+            while offset < expected:
+                # A stable order keeps pages from overlapping or skipping rows
+                page = remote_query(
+                    f"select * from {table} order by {order_by} limit {PAGE_SIZE} offset {offset}", api_key
+                ).get("reply", [])
+                if not page:
+                    break
+                rows.extend(page)
+                offset += len(page)
+
+            if len(rows) != expected:
+                raise Exception(f"Row count mismatch for table {table}: expected {expected}, got {len(rows)}")
+
+            definitions = ", ".join(f"{quote_identifier(row['Field'])} {sqlite_type(row.get('Type', ''))}"
+                                    for row in structure)
+            conn.execute(f"CREATE TABLE {quote_identifier(table)} ({definitions})")
+            placeholders = ", ".join("?" for _ in columns)
+            conn.executemany(
+                f"INSERT INTO {quote_identifier(table)} VALUES ({placeholders})",
+                [[row.get(column) for column in columns] for row in rows]
+            )
+            conn.execute(f"INSERT INTO {META_TABLE} VALUES (?, ?, ?)", (table, len(rows), time.time()))
+            row_counts[table] = len(rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Swap the finished snapshot in atomically
+    os.replace(tmp_path, mirror_path)
+    print(f"Mirrored {len(row_counts)} tables into {mirror_path}")
+    return row_counts
+
+
+def mirrored_tables(mirror_path: str = MIRROR_PATH, max_age: float = MIRROR_MAX_AGE) -> set:
+    """Return the names of tables mirrored less than max_age seconds ago."""
+    if not os.path.exists(mirror_path):
+        return set()
+    with sqlite3.connect(mirror_path) as conn:
+        rows = conn.execute(f"SELECT name FROM {META_TABLE} WHERE mirrored_at >= ?", (time.time() - max_age,))
+        return {row[0] for row in rows}
+
+
+def local_query(query: str, mirror_path: str = MIRROR_PATH) -> Optional[dict]:
+    """Run a read-only query against the mirror, or return None if it can't be answered locally.
+
+    Stale tables and empty results are left to the remote apidb.
+    """
+    if not READ_ONLY_PATTERN.match(query):
+        return None
+    referenced = {name.lower() for name in TABLE_REFERENCE_PATTERN.findall(query)}
+    available = {name.lower() for name in mirrored_tables(mirror_path)}
+    if not referenced or not referenced <= available:
+        return None
+
+    try:
+        with sqlite3.connect(f"file:{mirror_path}?mode=ro", uri=True) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(query).fetchall()
+    except sqlite3.Error as e:
+        print(f"Local mirror could not run query ({e}), falling back to remote")
+        return None
+    if not rows:
+        return None
+    # The remote apidb returns every value as a string; reply in the same shape
+    return {
+        "reply": [{key: None if value is None else str(value) for key, value in dict(row).items()} for row in rows],
+        "error": "OK"
+    }
+
+
+def dry_run(query: str, mirror_path: str = MIRROR_PATH) -> Optional[str]:
+    """Plan the query against the mirror; return an error message if it is certainly broken."""
+    if not os.path.exists(mirror_path):
+        return None
+    try:
+        with sqlite3.connect(f"file:{mirror_path}?mode=ro", uri=True) as conn:
+            conn.execute(f"EXPLAIN QUERY PLAN {query}")
+    except sqlite3.Error as e:
+        message = str(e)
+        if any(error in message for error in FATAL_DRY_RUN_ERRORS):
+            return message
+        print(f"Dry-run warning (possibly a MySQL-only construct): {message}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mirror the remote apidb into a local SQLite file")
+    parser.add_argument('--path', default=MIRROR_PATH, help='Mirror file path')
+    args = parser.parse_args()
+
+    api_key = get_api_key()
+    if not api_key:
+        print("API key retrieval failed. Exiting.")
+        return
+    row_counts = mirror_database(api_key, args.path)
+    for table, count in row_counts.items():
+        print(f"{table}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
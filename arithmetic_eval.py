@@ -0,0 +1,142 @@
+import ast
+import re
+import time
+import json
+import random
+import argparse
+import operator
+import tempfile
+import numpy as np
+from typing import List, Optional, Union
+
+Number = Union[int, float]
+
+SIMPLE_PATTERN = re.compile(r"^\s*(-?\d{1,15})\s*([-+*/])\s*(-?\d{1,15})\s*$")
+INT64_SAFE = 2 ** 31  # Operands below this cannot overflow int64 under + - *
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def safe_eval(expression: str) -> Number:
+    """Evaluate an arithmetic expression without eval: numbers, + - * / // %, unary signs, parentheses."""
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return BINARY_OPERATORS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return UNARY_OPERATORS[type(node.op)](visit(node.operand))
+        raise ValueError(f"Unsupported expression: {expression!r}")
+
+    if len(expression) > 200:
+        raise ValueError("Expression too long")
+    return visit(ast.parse(expression, mode="eval"))
+
+
+def evaluate_questions(questions: List[str]) -> List[Optional[Number]]:
+    """Evaluate many 'a op b' questions in bulk with NumPy.
+
+    Questions are parsed once and grouped by operator; anything outside the
+    simple grammar (or at risk of overflow/division by zero) goes through
+    safe_eval. Failed items come back as None.
+    """
+    results: List[Optional[Number]] = [None] * len(questions)
+    groups = {op: ([], [], []) for op in "+-*/"}  # op -> (indices, left, right)
+    fallback = []
+
+    for index, question in enumerate(questions):
+        if not isinstance(question, str):
+            fallback.append(index)
+            continue
+        parts = question.split()
+        if len(parts) != 3 or parts[1] not in groups:
+            match = SIMPLE_PATTERN.match(question)
+            if not match:
+                fallback.append(index)
+                continue
+            parts = match.groups()
+        left_text, op, right_text = parts
+        if len(left_text) > 15 or len(right_text) > 15:
+            fallback.append(index)
+            continue
+        try:
+            left, right = int(left_text), int(right_text)
+        except ValueError:
+            fallback.append(index)
+            continue
+        if abs(left) >= INT64_SAFE or abs(right) >= INT64_SAFE or (op == "/" and right == 0):
+            fallback.append(index)
+            continue
+        indices, lefts, rights = groups[op]
+        indices.append(index)
+        lefts.append(left)
+        rights.append(right)
+
+    for op, (indices, lefts, rights) in groups.items():
+        if not indices:
+            continue
+        a = np.array(lefts, dtype=np.int64)
+        b = np.array(rights, dtype=np.int64)
+        if op == "+":
+            values = a + b
+        elif op == "-":
+            values = a - b
+        elif op == "*":
+            values = a * b
+        else:
+            values = a / b
+        for index, value in zip(indices, values.tolist()):
+            results[index] = value
+
+    for index in fallback:
+        try:
+            results[index] = safe_eval(questions[index])
+        except (ValueError, SyntaxError, ZeroDivisionError, TypeError) as e:
+            print(f"Error evaluating expression '{questions[index]}': {e}")
+
+    return results
+
+
+def benchmark(item_count: int = 1_000_000, seed: int = 0) -> None:
+    """Compare bulk evaluation with per-item eval on a synthetic calibration file."""
+    rng = random.Random(seed)
+    data = {"test-data": [
+        {"question": f"{rng.randint(0, 100)} {rng.choice('+-*')} {rng.randint(0, 100)}", "answer": 0}
+        for _ in range(item_count)
+    ]}
+    with tempfile.NamedTemporaryFile("w+", suffix=".json") as f:
+        json.dump(data, f)
+        f.flush()
+        f.seek(0)
+        items = json.load(f)["test-data"]
+    questions = [item["question"] for item in items]
+
+    start = time.perf_counter()
+    bulk = evaluate_questions(questions)
+    bulk_time = time.perf_counter() - start
+
+    sample = questions[:100_000]
+    start = time.perf_counter()
+    per_item = [eval(question) for question in sample]
+    eval_time = (time.perf_counter() - start) * len(questions) / len(sample)
+
+    assert bulk[:len(sample)] == per_item
+    print(f"{item_count} items: bulk NumPy {bulk_time:.2f}s, per-item eval ~{eval_time:.2f}s "
+          f"(extrapolated from {len(sample)}), speed-up {eval_time / bulk_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bulk arithmetic evaluator")
+    parser.add_argument('--items', type=int, default=1_000_000, help='Number of synthetic items')
+    args = parser.parse_args()
+    benchmark(args.items)
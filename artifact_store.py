@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import zlib
+import requests
+from typing import Dict
+
+ARTIFACT_FOLDER = "./cache/artifacts"
+INDEX_FILE = "index.json"
+EXTRACTION_MARKER = ".artifact"  # Holds the hash of the archive last extracted into a folder
+CHUNK_SIZE = 64 * 1024
+
+
+def load_index(store_folder: str) -> Dict[str, dict]:
+    """Load the url -> artifact metadata index."""
+    index_path = os.path.join(store_folder, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Error loading artifact index: {e}")
+        return {}
+
+
+def save_index(store_folder: str, index: Dict[str, dict]) -> None:
+    """Atomically replace the artifact index."""
+    index_path = os.path.join(store_folder, INDEX_FILE)
+    fd, tmp_path = tempfile.mkstemp(dir=store_folder, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp_path, index_path)
+
+
+def fetch_artifact(url: str, store_folder: str = ARTIFACT_FOLDER, suffix: str = ".zip") -> str:
+    """Return the local path of the artifact at url, downloading only when it changed.
+
+    The request carries If-None-Match/If-Modified-Since from the previous
+    download; a 304 reuses the stored copy without touching the disk.
+    Downloads are stored once under their sha256 (content-addressed).
+    """
+    os.makedirs(store_folder, exist_ok=True)
+    index = load_index(store_folder)
+    entry = index.get(url)
+    cached_path = os.path.join(store_folder, entry["sha256"] + suffix) if entry else None
+    if cached_path and not os.path.exists(cached_path):
+        entry, cached_path = None, None
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 304 and cached_path:
+            print(f"Artifact not modified, using {cached_path}")
+            return cached_path
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        if cached_path:
+            print(f"Error fetching {url} ({e}), using stored copy {cached_path}")
+            return cached_path
+        raise
+
+    print(f"Downloading {url}...")
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=store_folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+        digest = hasher.hexdigest()
+        artifact_path = os.path.join(store_folder, digest + suffix)
+        if os.path.exists(artifact_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, artifact_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    index[url] = {
+        "sha256": digest,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    save_index(store_folder, index)
+    return artifact_path
+
+
+def file_crc32(file_path: str) -> int:
+    """Compute the CRC32 of a file, the checksum zip archives store per member."""
+    crc = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def extract_artifact(archive_path: str, extraction_path: str) -> int:
+    """Extract only the members missing or changed in extraction_path.
+
+    Returns the number of members written; 0 when the folder already holds
+    this exact archive, in which case nothing is written.
+    """
+    archive_hash = os.path.splitext(os.path.basename(archive_path))[0]
+    marker_path = os.path.join(extraction_path, EXTRACTION_MARKER)
+    if os.path.exists(marker_path):
+        with open(marker_path, "r", encoding="utf-8") as f:
+            if f.read().strip() == archive_hash:
+                return 0
+
+    os.makedirs(extraction_path, exist_ok=True)
+    written = 0
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        for member in zip_ref.infolist():
+            target = os.path.join(extraction_path, member.filename)
+            if member.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if os.path.exists(target) and os.path.getsize(target) == member.file_size:
+                if file_crc32(target) == member.CRC:
+                    continue
+            zip_ref.extract(member, extraction_path)
+            written += 1
+
+    with open(marker_path, "w", encoding="utf-8") as f:
+        f.write(archive_hash)
+    return written
+
+
+def read_member(archive_path: str, member: str) -> bytes:
+    """Read a single member straight from the archive without extracting it."""
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        return zip_ref.read(member)
+
+
+def fetch_and_extract(url: str, extraction_path: str, store_folder: str = ARTIFACT_FOLDER) -> str:
+    """Fetch the archive at url and lazily extract it into extraction_path."""
+    archive_path = fetch_artifact(url, store_folder)
+    written = extract_artifact(archive_path, extraction_path)
+    if written:
+        print(f"Extracted {written} files into {extraction_path}.")
+    else:
+        print(f"{extraction_path} is up to date.")
+    return archive_path
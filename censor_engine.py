@@ -0,0 +1,251 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import Callable, List, Optional, Tuple
+from polish_gazetteer import (
+    NAME_TRIE, SURNAME_TRIE, SURNAME_PATTERN, CAPITALIZED_WORD_PATTERN, fold_diacritics, match_city
+)
+
+CENSORED = "CENZURA"
+MAX_CITY_WORDS = 3
+
+Span = Tuple[int, int, str]  # (start, end, kind)
+
+AGE_PATTERNS = [
+    # "32 lata", "45 lat", "28-letni", "lat 60", "wiek: 32"
+    re.compile(r"\b(?P<span>\d{1,3})(?=\s*-?\s*(?:lat|lata|latek|letni|letnia|letniego|letniej|roku życia)\b)", re.IGNORECASE),
+    re.compile(r"\b(?:wiek|lat)\s*:?\s*(?P<span>\d{1,3})\b", re.IGNORECASE),
+]
+STREET_PATTERN = re.compile(
+    r"\b(?i:ul\.|ulic[aąęy]|al\.|alej[aąę]|alei|os\.|osiedl[eu]|pl\.|plac[ua]?)\s+"
+    r"(?P<span>(?:\d+\s+)?[A-ZĄĆĘŁŃÓŚŹŻ0-9][\w-]*(?:[ \t]+[A-ZĄĆĘŁŃÓŚŹŻ][\w-]*){0,3}"
+    r"(?:[ \t]+\d+[a-zA-Z]?(?:/\d+[a-zA-Z]?)?)?)"
+)
+# An unknown capitalized word followed by a house number is probably a street without a prefix
+HOUSE_NUMBER_PATTERN = re.compile(r"[ \t]+\d+[a-zA-Z]?(?:/\d+[a-zA-Z]?)?\b")
+WORD_GAP_PATTERN = re.compile(r"[ \t]+|[ \t]*-[ \t]*")
+PREVIOUS_WORD_PATTERN = re.compile(r"(\w+)[ \t]+$")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])[ \t]+|\n+")
+
+TITLES = {"pan", "pani", "pana", "panu", "panem", "panią", "panie", "obywatel", "obywatelka", "obywatela"}
+LOCATIVE_PREPOSITIONS = {"w", "we", "z", "ze", "do", "pod", "koło", "obok", "niedaleko", "spod", "przy"}
+SENTENCE_BOUNDARIES = ".!?:;\n\"'(–-"
+ENTITY_KINDS = {"person", "city", "street"}  # Span kinds whose text is censored everywhere it appears
+
+
+def is_sentence_initial(text: str, start: int) -> bool:
+    preceding = text[:start].rstrip(" \t")
+    return not preceding or preceding[-1] in SENTENCE_BOUNDARIES
+
+
+def previous_word(text: str, start: int) -> str:
+    match = PREVIOUS_WORD_PATTERN.search(text, max(0, start - 30), start)
+    return match.group(1).lower() if match else ""
+
+
+def adjacent(text: str, first: re.Match, second: re.Match) -> bool:
+    """True when two word matches are separated only by spaces or a hyphen (no line break)."""
+    return bool(WORD_GAP_PATTERN.fullmatch(text, first.end(), second.start()))
+
+
+def find_sensitive_spans(text: str) -> Tuple[List[Span], List[Span]]:
+    """Return (resolved spans, unresolved candidate spans) found with regexes and gazetteers."""
+    spans: List[Span] = []
+    for pattern in AGE_PATTERNS:
+        spans += [(m.start("span"), m.end("span"), "age") for m in pattern.finditer(text)]
+    spans += [(m.start("span"), m.end("span"), "street") for m in STREET_PATTERN.finditer(text)]
+
+    covered = set()
+    for start, end, _ in spans:
+        covered.update(range(start, end))
+
+    candidates: List[Span] = []
+    words = [word for word in CAPITALIZED_WORD_PATTERN.finditer(text) if word.start() not in covered]
+    index = 0
+    while index < len(words):
+        word = words[index]
+        following = words[index + 1] if index + 1 < len(words) and adjacent(text, word, words[index + 1]) else None
+
+        # Cities, possibly several words long (Zielonej Górze, Bielsku-Białej)
+        run = [word]
+        while len(run) < MAX_CITY_WORDS and index + len(run) < len(words) \
+                and adjacent(text, run[-1], words[index + len(run)]):
+            run.append(words[index + len(run)])
+        _, count = match_city([match.group() for match in run])
+        if count:
+            spans.append((word.start(), run[count - 1].end(), "city"))
+            index += count
+            continue
+
+        folded = fold_diacritics(word.group().upper())
+        following_folded = fold_diacritics(following.group().upper()) if following else ""
+        if NAME_TRIE.match(folded):
+            # First name, together with the surname that follows it
+            end = following.end() if following else word.end()
+            spans.append((word.start(), end, "person"))
+            index += 2 if following else 1
+            continue
+        if SURNAME_TRIE.match(folded):
+            spans.append((word.start(), word.end(), "person"))
+            index += 1
+            continue
+        if following and SURNAME_TRIE.match(following_folded):
+            # A first name outside the lexicon followed by a known surname; at a sentence start
+            # the first word may be an ordinary one ("Potem Nowak"), so only it is left to the resolver
+            if is_sentence_initial(text, word.start()):
+                candidates.append((word.start(), word.end(), "person"))
+                spans.append((following.start(), following.end(), "person"))
+            else:
+                spans.append((word.start(), following.end(), "person"))
+            index += 2
+            continue
+
+        preceding = previous_word(text, word.start())
+        number = HOUSE_NUMBER_PATTERN.match(text, word.end())
+        if preceding in TITLES:
+            # "pani Grzelak": surname-shaped words are certain, anything else goes to the resolver
+            target = spans if SURNAME_PATTERN.search(folded) else candidates
+            target.append((word.start(), word.end(), "person"))
+        elif following and SURNAME_PATTERN.search(following_folded):
+            # In "Podejrzany Zbyszek Prusiak" the pair is the last two words
+            after = words[index + 2] if index + 2 < len(words) else None
+            if not (after and adjacent(text, following, after)
+                    and SURNAME_PATTERN.search(fold_diacritics(after.group().upper()))):
+                candidates.append((word.start(), following.end(), "person"))
+                index += 1
+        elif is_sentence_initial(text, word.start()):
+            pass
+        elif number:
+            candidates.append((word.start(), number.end(), "street"))
+        elif preceding in LOCATIVE_PREPOSITIONS:
+            candidates.append((word.start(), word.end(), "city"))
+        index += 1
+
+    return spans, candidates
+
+
+def merge_person_spans(text: str, spans: List[Span]) -> List[Span]:
+    """Join person spans separated only by spaces, so a full name becomes a single CENZURA."""
+    merged: List[Span] = []
+    for span in sorted(spans):
+        if merged and span[2] == merged[-1][2] == "person" and not text[merged[-1][1]:span[0]].strip(" \t"):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], span[1]), "person")
+        else:
+            merged.append(span)
+    return merged
+
+
+def apply_spans(text: str, spans: List[Span]) -> str:
+    """Replace every span with CENZURA, merging overlapping spans; the rest of the text is untouched."""
+    parts, position = [], 0
+    for start, end, _ in sorted(spans):
+        if start < position:
+            if end > position:
+                position = end
+            continue
+        parts += [text[position:start], CENSORED]
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def censored_spans(original: str, censored: str) -> Optional[List[Span]]:
+    """Recover the spans of original that were replaced by CENZURA in censored.
+
+    Returns None when censored differs from original anywhere else. The literal
+    parts between CENZURA markers are located left to right with str.find, so
+    a reply that does not line up with the input is rejected in linear time.
+    """
+    parts = censored.split(CENSORED)
+    if len(parts) == 1:
+        return [] if censored == original else None
+    prefix, suffix = parts[0], parts[-1]
+    if len(prefix) + len(suffix) >= len(original) or not original.startswith(prefix) \
+            or not original.endswith(suffix):
+        return None
+
+    end = len(original) - len(suffix)
+    spans, position = [], len(prefix)
+    for part in parts[1:-1]:
+        # Every censored span covers at least one character
+        found = original.find(part, position + 1, end)
+        if found < 0:
+            return None
+        spans.append((position, found, "censored"))
+        position = found + len(part)
+    if position >= end:
+        return None
+    spans.append((position, end, "censored"))
+    return spans
+
+
+def verify_layout(original: str, censored: str) -> bool:
+    """True when censored equals original except for spans replaced by CENZURA (byte for byte elsewhere)."""
+    return censored_spans(original, censored) is not None
+
+
+def is_proper_name(text: str) -> bool:
+    """True for text that looks like a name: capitalized words, no digits."""
+    words = text.split()
+    return bool(words) and all(word[:1].isupper() and not any(c.isdigit() for c in word) for word in words)
+
+
+def consistent_spans(text: str, spans: List[Span]) -> List[Span]:
+    """Extend spans so every occurrence of an entity censored somewhere is censored everywhere.
+
+    Only names, cities and streets are propagated; text the model censored
+    without a kind ("censored") counts only when it looks like a proper name,
+    so a common word censored once is not censored everywhere.
+    """
+    entities = set()
+    for start, end, kind in spans:
+        entity = text[start:end]
+        if kind not in ENTITY_KINDS and not (kind == "censored" and is_proper_name(entity)):
+            continue
+        entities.add(entity)
+        if kind != "street":
+            # "Jan Nowak" in one place also covers a bare "Nowak" in another
+            entities.update(word for word in entity.split() if word[:1].isupper())
+    entities = sorted((entity for entity in entities if len(entity) > 2 and not entity.isdigit()), key=len, reverse=True)
+    if not entities:
+        return spans
+    pattern = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(entity) for entity in entities) + r")(?!\w)")
+    return spans + [(m.start(), m.end(), "consistency") for m in pattern.finditer(text)]
+
+
+def split_chunks(text: str, max_chars: int, overlap_chars: int) -> List[Tuple[int, int, int]]:
+    """Split text into (context_start, start, end) chunks at sentence or line boundaries.
+
+    The [start, end) parts cover the text exactly once; [context_start, start)
+    repeats whole sentences before the chunk so entities near a cut keep their context.
+    A single sentence longer than max_chars becomes a chunk of its own.
+    """
+    boundaries = [m.end() for m in SENTENCE_END_PATTERN.finditer(text) if m.end() < len(text)] + [len(text)]
+    chunks, start = [], 0
+    while start < len(text):
+        fitting = bisect_right(boundaries, start + max_chars) - 1
+        if fitting >= 0 and boundaries[fitting] > start:
+            end = boundaries[fitting]
+        else:
+            end = boundaries[bisect_right(boundaries, start)]
+        context = bisect_left(boundaries, start - overlap_chars)
+        context_start = boundaries[context] if boundaries[context] < start else start
+        chunks.append((context_start, start, end))
+        start = end
+    return chunks
+
+
+def censor_text(text: str,
+                resolve: Optional[Callable[[str, List[Span]], List[bool]]] = None) -> str:
+    """Censor names, cities, streets and ages locally.
+
+    Spans the regexes and gazetteers cannot decide are passed to resolve, which
+    returns one verdict per candidate; without a resolver they are left as is.
+    """
+    spans, candidates = find_sensitive_spans(text)
+    if candidates and resolve:
+        verdicts = resolve(text, candidates)
+        spans += [candidate for candidate, censor in zip(candidates, verdicts) if censor]
+    censored = apply_spans(text, merge_person_spans(text, spans))
+    if not verify_layout(text, censored):
+        raise ValueError("Censorship changed text outside the censored spans")
+    return censored
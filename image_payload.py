@@ -0,0 +1,184 @@
+import io
+import base64
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional, Union
+from PIL import Image, ImageChops
+from kv_store import KVStore
+
+PAYLOAD_CACHE_DB = "./cache/image_payloads.sqlite"
+PROCESSING_VERSION = "v3"  # Bump when resizing/encoding changes to invalidate cached payloads
+# The vision model scales high-detail images to fit 2048x2048, then the short side to 768;
+# low detail is a single 512x512 view. Pixels beyond that only cost bytes.
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_SIDE = 512
+JPEG_QUALITY = 85
+# Images with at most this many colours (scans, diagrams, screenshots) stay PNG: JPEG blurs small text
+PNG_MAX_COLORS = 256
+PAYLOAD_CACHE_MAX_ENTRIES = 200  # Oldest payloads are evicted beyond this
+
+MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+ImageSource = Union[str, Path, bytes]
+
+_payload_cache: Optional[KVStore] = None
+_payload_cache_lock = threading.Lock()
+
+
+def detect_format(data: bytes) -> Optional[str]:
+    """Return the MIME type from the file signature, whatever the file name says."""
+    for magic, mime in MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def choose_detail(width: int, height: int) -> str:
+    """Low detail is enough when the image fits in a single 512px view."""
+    return "low" if max(width, height) <= LOW_DETAIL_SIDE else "high"
+
+
+def target_size(width: int, height: int, detail: str) -> tuple:
+    """Largest size the model will actually look at for this detail level."""
+    if detail == "low":
+        scale = min(1.0, LOW_DETAIL_SIDE / max(width, height))
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+        scale = min(scale, HIGH_DETAIL_SHORT_SIDE / min(width * scale, height * scale) * scale)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def is_grayscale(image: Image.Image) -> bool:
+    """True for grayscale images, including RGB files whose channels are all equal."""
+    if image.mode in ("L", "LA"):
+        return True
+    if image.mode != "RGB":
+        return False
+    red, green, blue = image.split()
+    return ImageChops.difference(red, green).getbbox() is None and ImageChops.difference(red, blue).getbbox() is None
+
+
+def keeps_png(image: Image.Image) -> bool:
+    """True for images JPEG would damage: transparency, a palette, grayscale or few colours."""
+    return (image.mode in ("RGBA", "LA", "P", "1") or is_grayscale(image)
+            or image.getcolors(PNG_MAX_COLORS) is not None)
+
+
+def encode_image(data: bytes, detail: str = "auto") -> dict:
+    """Downsize and re-encode image bytes for a vision request.
+
+    Photos become JPEG; images with transparency, a palette, grayscale or few
+    colours (diagrams, scanned text) stay PNG. The original is kept when it is
+    already smaller.
+    """
+    mime = detect_format(data)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if detail == "auto":
+                detail = choose_detail(*image.size)
+            size = target_size(*image.size, detail)
+            resized = image if size == image.size else image.resize(size, Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if keeps_png(resized):
+                if resized.mode not in ("RGBA", "LA", "P", "1", "L") and is_grayscale(resized):
+                    resized = resized.convert("L")
+                resized.save(buffer, format="PNG", optimize=True)
+                encoded_mime = "image/png"
+            else:
+                resized.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+                encoded_mime = "image/jpeg"
+            encoded = buffer.getvalue()
+            width, height = size
+            if size == image.size and mime and len(data) <= len(encoded):
+                encoded, encoded_mime = data, mime
+    except (OSError, SyntaxError, ValueError) as e:
+        # Not decodable here (e.g. a corrupted photo): send it unchanged and let the model judge
+        print(f"Could not preprocess image ({e}), sending the original bytes")
+        encoded, encoded_mime = data, mime or "image/jpeg"
+        detail = "high" if detail == "auto" else detail
+        width = height = None
+
+    return {
+        "mime": encoded_mime,
+        "base64": base64.b64encode(encoded).decode("utf-8"),
+        "detail": detail,
+        "width": width,
+        "height": height,
+        "original_bytes": len(data),
+        "encoded_bytes": len(encoded),
+    }
+
+
+def get_payload_cache() -> KVStore:
+    global _payload_cache
+    with _payload_cache_lock:
+        if _payload_cache is None:
+            # Payloads can always be recomputed, so the faster, less durable sync mode is fine
+            _payload_cache = KVStore(PAYLOAD_CACHE_DB, table="payloads", synchronous="NORMAL")
+    return _payload_cache
+
+
+def prepare_image(source: ImageSource, detail: str = "auto") -> dict:
+    """Return the encoded payload for an image file or bytes, cached by content hash."""
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    key = hashlib.sha256(data).hexdigest() + f":{detail}:{PROCESSING_VERSION}"
+    cache = get_payload_cache()
+    payload = cache.get(key)
+    if payload is None:
+        payload = encode_image(data, detail)
+        cache.put(key, payload)
+        cache.trim(PAYLOAD_CACHE_MAX_ENTRIES)
+    return payload
+
+
+def image_content(source: ImageSource, detail: str = "auto") -> dict:
+    """Chat message content part for an image, ready to put into a vision request."""
+    return payload_content(prepare_image(source, detail))
+
+
+def payload_content(payload: dict) -> dict:
+    """Chat message content part for an already prepared payload."""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{payload['mime']};base64,{payload['base64']}",
+            "detail": payload["detail"]
+        }
+    }
+
+
+def benchmark(paths: list, detail: str = "auto") -> None:
+    """Report request bytes for the original files versus the preprocessed payloads."""
+    total_original = total_encoded = 0
+    for path in paths:
+        data = Path(path).read_bytes()
+        payload = encode_image(data, detail)
+        original = len(base64.b64encode(data))
+        encoded = len(payload["base64"])
+        total_original += original
+        total_encoded += encoded
+        print(f"{path}: {detect_format(data)} -> {payload['mime']} ({payload['detail']}), "
+              f"{original} -> {encoded} base64 bytes ({1 - encoded / max(original, 1):.0%} saved)")
+    saved = total_original - total_encoded
+    print(f"Total: {total_original} -> {total_encoded} bytes, {saved} saved "
+          f"({saved / max(total_original, 1):.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing for vision requests")
+    parser.add_argument('paths', nargs='+', help='Image files')
+    parser.add_argument('--detail', default="auto", choices=["auto", "low", "high"], help='Detail level')
+    args = parser.parse_args()
+    benchmark(args.paths, args.detail)
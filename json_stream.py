@@ -0,0 +1,101 @@
+import json
+import re
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_TAIL = set("0123456789.eE+-")
+
+
+class JsonStreamReader:
+    """Incremental reader for a top-level JSON object arriving in text chunks.
+
+    Small values are decoded whole; the array under stream_key is yielded one
+    element at a time, so memory stays bounded by the largest single element.
+    """
+
+    def __init__(self, chunks: Iterable[str]):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _peek(self) -> str:
+        self._skip_whitespace()
+        return self.buffer[self.pos]
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at stream offset, got '{self.buffer[self.pos]}'")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        while True:
+            self._skip_whitespace()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut by a chunk boundary ("1." / "1e") decodes as a shorter number
+            truncated = end == len(self.buffer) or self.buffer[end] in NUMBER_TAIL
+            if isinstance(value, (int, float)) and truncated and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _iter_array(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' in array, got '{separator}'")
+
+    def iter_object(self, stream_key: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, value) pairs; the value under stream_key is an element iterator.
+
+        The element iterator must be exhausted before the next pair is requested.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == stream_key and self._peek() == "[":
+                elements = self._iter_array()
+                yield key, elements
+                for _ in elements:
+                    pass
+            else:
+                yield key, self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' in object, got '{separator}'")
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class KVStore:
+    """Small transactional key-value store backed by SQLite in WAL mode.
+
+    Values are stored as JSON. Every put is its own transaction, so a crash
+    mid-run loses at most the item being written and never corrupts the file.
+
+    synchronous="NORMAL" makes commits faster by syncing only at WAL
+    checkpoints; the file stays consistent, but the last commits can be lost
+    on power loss or an OS crash. Only use it for caches that can be rebuilt.
+    """
+
+    def __init__(self, db_path: str, table: str = "kv", legacy_json_path: Optional[str] = None,
+                 synchronous: str = "FULL"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        if synchronous not in ("FULL", "NORMAL"):
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db_path = str(db_path)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+        if legacy_json_path:
+            self.import_json(str(legacy_json_path))
+
+    def import_json(self, json_path: str) -> int:
+        """Import a legacy JSON cache file once, if the store is still empty."""
+        if len(self) or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error importing legacy cache {json_path}: {e}")
+            return 0
+        self.batch_put(data)
+        print(f"Imported {len(data)} entries from {json_path} into {self.db_path}")
+        return len(data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value stored under key, or default."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a single value atomically."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def batch_put(self, items: Dict[str, Any]) -> None:
+        """Store many values in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in items.items()],
+            )
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over all (key, value) pairs."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, value FROM {self.table}").fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def values(self) -> Iterator[Any]:
+        """Iterate over all values."""
+        for _, value in self.items():
+            yield value
+
+    def trim(self, max_entries: int) -> int:
+        """Delete the oldest-written entries beyond max_entries; returns how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE rowid NOT IN "
+                f"(SELECT rowid FROM {self.table} ORDER BY rowid DESC LIMIT ?)",
+                (max_entries,),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
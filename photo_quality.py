@@ -0,0 +1,92 @@
+import argparse
+import numpy as np
+from typing import Dict, Optional, Tuple
+from PIL import Image
+
+# Luminance thresholds (0..1) and clipped-pixel ratios that call for a correction
+DARK_MEAN = 0.25
+BRIGHT_MEAN = 0.72
+CLIP_RATIO = 0.25
+DARK_CLIP_LEVEL = 8 / 255
+BRIGHT_CLIP_LEVEL = 247 / 255
+# Corruption shows up as pixel noise or as horizontal bands: many rows that differ sharply from the previous one
+NOISE_LEVEL = 0.12  # Share of pixels with a strong Laplacian response
+LAPLACIAN_LEVEL = 0.3
+BAND_RATIO = 4.0  # 95th percentile row-to-row difference relative to the median one
+BAND_FLOOR = 0.01  # Added to the median so flat images do not turn tiny differences into bands
+# Corruption noise is uncorrelated between neighbouring pixels; fine texture (fabric, foliage) is not
+NOISE_CORRELATION = 0.3
+ANALYSIS_SIZE = 512  # Longest side the image is reduced to before measuring
+
+
+def image_metrics(image_path: str) -> Optional[Dict[str, float]]:
+    """Measure luminance, clipping and noise of an image; None if it cannot be decoded."""
+    try:
+        with Image.open(image_path) as image:
+            image.load()
+            gray = image.convert("L")
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"Could not decode {image_path}: {e}")
+        return None
+
+    gray.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    luminance = np.asarray(gray, dtype=np.float32) / 255.0
+    if luminance.size == 0 or min(luminance.shape) < 3:
+        return None
+
+    # Laplacian magnitude: large everywhere for noise, only at edges for a normal photo
+    laplacian = np.abs(4 * luminance[1:-1, 1:-1] - luminance[:-2, 1:-1] - luminance[2:, 1:-1]
+                       - luminance[1:-1, :-2] - luminance[1:-1, 2:])
+    row_steps = np.abs(np.diff(luminance, axis=0)).mean(axis=1)
+    left, right = luminance[:, :-1].ravel(), luminance[:, 1:].ravel()
+    correlation = float(np.corrcoef(left, right)[0, 1]) if min(left.std(), right.std()) > 1e-6 else 1.0
+    return {
+        "mean": float(luminance.mean()),
+        "p05": float(np.percentile(luminance, 5)),
+        "p95": float(np.percentile(luminance, 95)),
+        "dark_clip": float((luminance <= DARK_CLIP_LEVEL).mean()),
+        "bright_clip": float((luminance >= BRIGHT_CLIP_LEVEL).mean()),
+        "noise": float((laplacian > LAPLACIAN_LEVEL).mean()),
+        "correlation": correlation,
+        "band_ratio": float(np.percentile(row_steps, 95) / (np.median(row_steps) + BAND_FLOOR)),
+    }
+
+
+def confidence(distance: float, scale: float) -> float:
+    """Map the distance past (positive) or short of (negative) a threshold to a 0.5..0.99 confidence."""
+    return float(min(0.99, max(0.5, 0.5 + abs(distance) / scale * 0.5)))
+
+
+def assess_photo(image_path: str) -> Tuple[str, float, Optional[Dict[str, float]]]:
+    """Decide REPAIR, BRIGHTEN, DARKEN or OK for a photo, with a confidence score."""
+    metrics = image_metrics(image_path)
+    if metrics is None:
+        return "REPAIR", 0.99, None
+
+    # High variance alone is not corruption: noise counts only when neighbouring pixels are unrelated
+    if metrics["band_ratio"] > BAND_RATIO:
+        return "REPAIR", confidence(metrics["band_ratio"] / BAND_RATIO - 1, 0.5), metrics
+    if metrics["noise"] > NOISE_LEVEL and metrics["correlation"] < NOISE_CORRELATION:
+        distance = min(metrics["noise"] / NOISE_LEVEL - 1, (NOISE_CORRELATION - metrics["correlation"]) / NOISE_CORRELATION)
+        return "REPAIR", confidence(distance, 0.5), metrics
+    if metrics["mean"] < DARK_MEAN or metrics["dark_clip"] > CLIP_RATIO:
+        distance = max(DARK_MEAN - metrics["mean"], metrics["dark_clip"] - CLIP_RATIO)
+        return "BRIGHTEN", confidence(distance, 0.15), metrics
+    if metrics["mean"] > BRIGHT_MEAN or metrics["bright_clip"] > CLIP_RATIO:
+        distance = max(metrics["mean"] - BRIGHT_MEAN, metrics["bright_clip"] - CLIP_RATIO)
+        return "DARKEN", confidence(distance, 0.15), metrics
+
+    # OK: confidence grows with the margin to the nearest threshold
+    margin = min(metrics["mean"] - DARK_MEAN, BRIGHT_MEAN - metrics["mean"],
+                 CLIP_RATIO - metrics["dark_clip"], CLIP_RATIO - metrics["bright_clip"],
+                 (NOISE_LEVEL - metrics["noise"]) / NOISE_LEVEL * 0.15)
+    return "OK", confidence(margin, 0.15), metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assess photos locally: REPAIR, BRIGHTEN, DARKEN or OK")
+    parser.add_argument('paths', nargs='+', help='Image files')
+    args = parser.parse_args()
+    for path in args.paths:
+        command, score, metrics = assess_photo(path)
+        print(f"{path}: {command} ({score:.2f}) {metrics}")
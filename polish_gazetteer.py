@@ -0,0 +1,154 @@
+import re
+import unicodedata
+
+# Polish first-name lexicon (nominative), matched after diacritic folding
+POLISH_FIRST_NAMES = """
+ADAM ADRIAN AGATA AGNIESZKA ALEKSANDER ALEKSANDRA ALICJA ANDRZEJ ANETA ANNA ANTONI ARKADIUSZ
+ARTUR AZAZEL BARBARA BARTOSZ BEATA BOGDAN BOGUSŁAW BOŻENA CEZARY CZESŁAW DAMIAN DANIEL DANUTA
+DARIUSZ DAWID DOROTA EDWARD ELŻBIETA EMILIA EWA EWELINA FILIP FRANCISZEK GABRIELA GRAŻYNA
+GRZEGORZ HALINA HANNA HENRYK HUBERT IGOR IRENA IWONA IZABELA JACEK JADWIGA JAKUB JAN JANINA
+JANUSZ JAROSŁAW JERZY JOANNA JOLANTA JÓZEF JULIA JULIAN JUSTYNA KACPER KAMIL KAMILA KAROL
+KAROLINA KATARZYNA KAZIMIERZ KINGA KLAUDIA KONRAD KRYSTYNA KRZYSZTOF LECH LESZEK LUCYNA ŁUKASZ
+MACIEJ MAGDALENA MAJA MAŁGORZATA MARCIN MAREK MARIA MARIAN MARIUSZ MARTA MARZENA MATEUSZ MICHAŁ
+MIROSŁAW MONIKA NATALIA NIKOLA OLIWIA PATRYCJA PAULINA PAWEŁ PIOTR PRZEMYSŁAW RADOSŁAW RAFAŁ
+RENATA ROBERT ROMAN RYSZARD SEBASTIAN SŁAWOMIR STANISŁAW STEFAN SYLWIA SZYMON TADEUSZ TERESA
+TOMASZ URSZULA WALDEMAR WANDA WERONIKA WIESŁAW WIKTORIA WIT WOJCIECH ZBIGNIEW ZDZISŁAW ZOFIA
+ZUZANNA ZYGFRYD ZYGMUNT
+""".split()
+
+# Declension endings (folded) that may follow a stem, per nominative class
+MASCULINE_SUFFIXES = {"", "A", "U", "OWI", "EM", "IEM", "E", "IE"}
+FEMININE_SUFFIXES = {"A", "Y", "I", "E", "O"}
+# Consonant alternations before the feminine dative/locative -e (BARBARA -> BARBARZE)
+FEMININE_ALTERNATIONS = {"R": "RZ", "N": "NI", "D": "DZI", "T": "CI", "S": "SI", "L": "L", "K": "C", "G": "DZ"}
+SURNAME_PATTERN = re.compile(r"(SK|CK|DZK|WSK)(I|A|IEGO|IEJ|IEMU|IM|IE)$|(AK|EK|UK|CZ|SZ|EWICZ)(A|OWI|IEM|U)?$")
+MASCULINE_SURNAME_PATTERN = re.compile(r"(SKI|CKI|DZKI|IEGO|IEMU|SKIM|CKIM)$")
+FEMININE_SURNAME_PATTERN = re.compile(r"(SKA|CKA|DZKA|SKIEJ|CKIEJ)$")
+CAPITALIZED_WORD_PATTERN = re.compile(r"\b[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+\b")
+
+
+def fold_diacritics(text):
+    """Fold Polish diacritics the way the /people API expects (RAFAŁ -> RAFAL)."""
+    text = text.replace("Ł", "L").replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+class NameTrie:
+    """Trie of folded name stems mapping to (nominative, allowed suffixes)."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, stem, nominative, suffixes):
+        node = self.root
+        for char in stem:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append((nominative, suffixes))
+
+    def match(self, word):
+        """Return every nominative for which some stem prefix plus a valid ending spells word.
+
+        Exact forms come first, then longer stems before shorter ones.
+        """
+        node, matches = self.root, []
+        for index in range(len(word) + 1):
+            for nominative, suffixes in node.get(None, []):
+                if word[index:] in suffixes and nominative not in matches:
+                    matches.insert(0, nominative)
+            if index == len(word) or word[index] not in node:
+                break
+            node = node[word[index]]
+        if word in matches:
+            matches.remove(word)
+            matches.insert(0, word)
+        return matches
+
+
+def build_name_trie(names=POLISH_FIRST_NAMES):
+    """Insert every lexicon name with the stems of its declined forms."""
+    trie = NameTrie()
+    for name in names:
+        folded = fold_diacritics(name)
+        if folded.endswith("A"):
+            stem = folded[:-1]
+            trie.insert(stem, folded, FEMININE_SUFFIXES)
+            alternation = FEMININE_ALTERNATIONS.get(stem[-1])
+            if alternation:
+                trie.insert(stem[:-1] + alternation, folded, {"E"})
+        else:
+            trie.insert(folded, folded, MASCULINE_SUFFIXES)
+            # Fleeting e: PAWEL -> PAWLA, MAREK -> MARKA
+            if len(folded) > 3 and folded[-2] == "E":
+                trie.insert(folded[:-2] + folded[-1], folded, MASCULINE_SUFFIXES - {""})
+    return trie
+
+
+NAME_TRIE = build_name_trie()
+
+# Common Polish surnames that do not carry a -ski/-cki ending (those are caught by SURNAME_PATTERN)
+COMMON_SURNAMES = """
+ADAMCZYK BARAN BĄK DUDA DUDEK JAKUBIAK KACZMAREK KOWALCZYK KOZIEŁ KRAWCZYK KRÓL KUBIAK LIS
+MARCINIAK MAZUR MICHALAK NOWAK PAWLAK PIETRZAK SIKORA SZEWCZYK WALCZAK WIECZOREK WŁODARCZYK
+WÓJCIK WOŹNIAK WRÓBEL ZAJĄC
+""".split()
+
+SURNAME_TRIE = build_name_trie(COMMON_SURNAMES)
+
+# Polish cities (nominative); multi-word names are matched word by word, hyphens included
+POLISH_CITIES = """
+Białystok;Bielsko-Biała;Bydgoszcz;Bytom;Chełm;Chorzów;Częstochowa;Elbląg;Gdańsk;Gdynia;Gliwice;
+Gniezno;Gorzów Wielkopolski;Grudziądz;Jelenia Góra;Kalisz;Katowice;Kielce;Konin;Koszalin;Kraków;
+Legnica;Leszno;Lublin;Łódź;Nowy Sącz;Nowy Targ;Olsztyn;Opole;Płock;Poznań;Przemyśl;Radom;Rybnik;
+Rzeszów;Siedlce;Słupsk;Sopot;Stalowa Wola;Suwałki;Szczecin;Tarnów;Toruń;Wałbrzych;Warszawa;
+Włocławek;Wrocław;Zakopane;Zamość;Zielona Góra
+""".replace("\n", "").split(";")
+
+# Declined forms that the stem + ending rule cannot produce
+IRREGULAR_CITY_FORMS = {
+    "BIALYSTOK": ["BIALYMSTOKU", "BIALEGOSTOKU"],
+    "SUWALKI": ["SUWALK", "SUWALKACH", "SUWALKAMI"],
+    "ZAKOPANE": ["ZAKOPANEM", "ZAKOPANEGO"],
+}
+# Noun and adjective endings a city word may take (folded)
+CITY_SUFFIXES = {
+    "", "A", "E", "I", "O", "U", "Y", "IA", "IE", "IU", "EM", "ZE", "OM", "ACH", "AMI",
+    "EJ", "EGO", "IEGO", "IEJ", "YM", "IM",
+}
+CITY_WORD_SEPARATOR = re.compile(r"[ \t]+|-")
+
+
+def city_word_stem(word):
+    """Strip the nominative vowel so that declined forms share a stem (WARSZAWA -> WARSZAW)."""
+    folded = fold_diacritics(word.upper())
+    return folded[:-1] if folded[-1] in "AEIOY" else folded
+
+
+def build_city_trie(cities=POLISH_CITIES):
+    """Index every city by the stem of its first word; the remaining word stems go to the tails table."""
+    trie, tails = NameTrie(), {}
+    for city in cities:
+        words = [word for word in CITY_WORD_SEPARATOR.split(city) if word]
+        folded = fold_diacritics(city.upper())
+        trie.insert(city_word_stem(words[0]), folded, CITY_SUFFIXES)
+        for form in IRREGULAR_CITY_FORMS.get(folded, []):
+            trie.insert(form, folded, {""})
+        tails[folded] = [city_word_stem(word) for word in words[1:]]
+    return trie, tails
+
+
+CITY_TRIE, CITY_TAILS = build_city_trie()
+
+
+def match_city_word(word, stem):
+    """True when word is stem plus a city ending."""
+    folded = fold_diacritics(word.upper())
+    return folded.startswith(stem) and folded[len(stem):] in CITY_SUFFIXES
+
+
+def match_city(words):
+    """Return (nominative, word count) for the city starting at words[0], or (None, 0)."""
+    for city in CITY_TRIE.match(fold_diacritics(words[0].upper())):
+        tail = CITY_TAILS[city]
+        if len(words) > len(tail) and all(match_city_word(word, stem) for word, stem in zip(words[1:], tail)):
+            return city, len(tail) + 1
+    return None, 0
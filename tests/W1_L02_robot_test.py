@@ -1,33 +1,22 @@
+import json
+import os
+import tempfile
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
+import requests
+from answer_memo import AnswerMemo
 from W1_L02_robot import (
-    initialize_openai_api,
-    start_verification,
+    FALLBACK_ANSWER,
+    ConversationEngine,
     answer_with_openai,
-    construct_answer,
-    send_answer
+    find_override,
+    main
 )
 
 class TestRobotVerification(unittest.TestCase):
 
-    @patch("W1_L02_robot.requests.post")
-    def test_start_verification_successful(self, mock_post):
-        """Test successful start of verification process with a mock response."""
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"text": "What is the capital of Poland?", "msgID": "12345"}
-
-        response = start_verification()
-        self.assertIsNotNone(response)
-        self.assertEqual(response["text"], "What is the capital of Poland?")
-        self.assertEqual(response["msgID"], "12345")
-
-    @patch("W1_L02_robot.requests.post")
-    def test_start_verification_failure(self, mock_post):
-        """Test failed start of verification with an HTTP error."""
-        mock_post.side_effect = requests.RequestException("Network error")
-        response = start_verification()
-        self.assertIsNone(response)
-
     @patch("W1_L02_robot.openai.ChatCompletion.create")
     def test_answer_with_openai_successful(self, mock_openai_create):
         """Test OpenAI API generates an answer in English regardless of prompt language."""
@@ -47,39 +36,165 @@ class TestRobotVerification(unittest.TestCase):
         answer = answer_with_openai(question)
         self.assertEqual(answer, "I am unable to provide that information.")
 
-    def test_construct_answer_incorrect_answer(self):
+    def test_find_override_incorrect_answer(self):
         """Test that predefined incorrect answers are returned when applicable."""
-        question = "What is the capital of Poland?"
-        answer = construct_answer(question, msg_id="12345")
-        self.assertEqual(answer, {"text": "Kraków", "msgID": "12345"})
+        self.assertEqual(find_override("What is the capital of Poland?"), "Kraków")
 
-    @patch("W1_L02_robot.answer_with_openai")
-    def test_construct_answer_openai_answer(self, mock_answer_with_openai):
-        """Test that OpenAI provides an answer when no incorrect answer is predefined."""
-        mock_answer_with_openai.return_value = "4"
-        question = "What is 2 + 2?"
-        answer = construct_answer(question, msg_id="67890")
-        self.assertEqual(answer, {"text": "4", "msgID": "67890"})
-
-    @patch("W1_L02_robot.requests.post")
-    def test_send_answer_successful(self, mock_post):
-        """Test successful sending of an answer."""
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.text = "Verification successful"
-
-        answer = {"text": "4", "msgID": "67890"}
-        send_answer(answer)
-        mock_post.assert_called_once_with(VERIFY_URL, json=answer)
-
-    @patch("W1_L02_robot.requests.post")
-    def test_send_answer_failure(self, mock_post):
-        """Test sending answer when there's a network error."""
-        mock_post.side_effect = requests.RequestException("Network error")
-
-        answer = {"text": "4", "msgID": "67890"}
-        with self.assertLogs(level="INFO") as log:
-            send_answer(answer)
-            self.assertIn("Error sending answer", log.output[0])
+    def test_find_override_no_match(self):
+        """Test that questions without an override phrase are left to the memo or OpenAI."""
+        self.assertIsNone(find_override("What is 2 + 2?"))
+
+class FakeRobot(BaseHTTPRequestHandler):
+    """Local /verify robot: asks the scripted questions in order under one msgID."""
+
+    script = []  # list of (question, expected answer)
+    received = []
+    status = 200
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeRobot.received.append(payload)
+        if payload["text"] == "READY":
+            reply = {"text": self.script[0][0], "msgID": "4242"}
+        else:
+            turn = len(FakeRobot.received) - 2
+            expected = self.script[turn][1]
+            if payload["msgID"] != "4242" or payload["text"] != expected:
+                reply = {"text": "ERROR: wrong answer", "msgID": "0"}
+            elif turn + 1 < len(self.script):
+                reply = {"text": self.script[turn + 1][0], "msgID": "4242"}
+            else:
+                reply = {"text": "OK", "msgID": "4242"}
+        body = json.dumps(reply).encode("utf-8")
+        self.send_response(FakeRobot.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestConversationEngine(unittest.TestCase):
+
+    def setUp(self):
+        FakeRobot.received = []
+        FakeRobot.status = 200
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRobot)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/verify"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.memo = AnswerMemo(os.path.join(self.tmp_dir.name, "memo.sqlite"))
+        self.llm = MagicMock(return_value="4")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def engine(self, **kwargs):
+        return ConversationEngine(verify_url=self.url, memo=self.memo, llm=self.llm, **kwargs)
+
+    def test_verification_starts_with_ready(self):
+        """Test the dialogue is opened with READY under msgID 0 and the first question is answered."""
+        FakeRobot.script = [("What is 2 + 2?", "4")]
+        reply = self.engine().run()
+
+        self.assertEqual(FakeRobot.received[0], {"text": "READY", "msgID": "0"})
+        self.assertEqual(FakeRobot.received[1], {"text": "4", "msgID": "4242"})
+        self.assertEqual(reply, {"text": "OK", "msgID": "4242"})
+
+    def test_route_prefers_override(self):
+        """Test that predefined incorrect answers win over the memo and the LLM."""
+        self.memo.put("What is the capital of Poland?", "Warsaw")
+        answer, source = self.engine().route("What is the capital of Poland?", deadline=float("inf"))
+        self.assertEqual((answer, source), ("Kraków", "override"))
+        self.llm.assert_not_called()
+
+    def test_route_uses_llm_without_override_or_memo(self):
+        """Test that the LLM answers questions that are neither overridden nor remembered."""
+        answer, source = self.engine().route("What is 2 + 2?", deadline=float("inf"))
+        self.assertEqual((answer, source), ("4", "llm"))
+        self.llm.assert_called_once()
+
+    def test_http_error_from_robot(self):
+        """Test an HTTP error status from the robot is raised to the caller."""
+        FakeRobot.script = [("What is 2 + 2?", "4")]
+        FakeRobot.status = 500
+        with self.assertRaises(requests.HTTPError):
+            self.engine().run()
+
+    def test_network_error(self):
+        """Test a network error while sending is raised to the caller."""
+        session = MagicMock()
+        session.post.side_effect = requests.ConnectionError("Network error")
+        with self.assertRaises(requests.RequestException):
+            self.engine(session=session).run()
+
+    @patch("W1_L02_robot.initialize_openai_api")
+    @patch("W1_L02_robot.ConversationEngine")
+    def test_main_reports_request_errors(self, mock_engine, _):
+        """Test main catches request errors from the dialogue and closes the session."""
+        mock_engine.return_value.run.side_effect = requests.ConnectionError("Network error")
+        main()
+        mock_engine.return_value.session.close.assert_called_once()
+
+    def test_multi_turn_dialogue_routes_each_turn(self):
+        """Test the engine answers follow-up questions under the same msgID until the robot says OK."""
+        FakeRobot.script = [("What is the capital of Poland?", "Kraków"), ("What is 2 + 2?", "4")]
+        engine = self.engine()
+
+        reply = engine.run()
+
+        self.assertEqual(reply["text"], "OK")
+        self.assertEqual([turn["source"] for turn in engine.state["4242"]], ["override", "llm"])
+        self.assertEqual(FakeRobot.received[1], {"text": "Kraków", "msgID": "4242"})
+        self.llm.assert_called_once()
+
+    def test_accepted_llm_answer_is_remembered(self):
+        """Test an accepted LLM answer is stored and the next dialogue is served from the memo."""
+        FakeRobot.script = [("What is 2 + 2?", "4")]
+        self.engine().run()
+        self.assertEqual(self.memo.get("what is 2 + 2"), "4")
+
+        FakeRobot.received = []
+        self.llm.reset_mock()
+        engine = self.engine()
+        reply = engine.run()
+
+        self.assertEqual(reply["text"], "OK")
+        self.assertEqual(engine.state["4242"][0]["source"], "memo")
+        self.llm.assert_not_called()
+
+    def test_every_verified_llm_answer_is_remembered(self):
+        """Test each LLM answer the robot accepted is stored, not only the last one."""
+        FakeRobot.script = [("What is 2 + 2?", "4"), ("What is 3 + 3?", "6")]
+        self.llm.side_effect = lambda question, timeout=None: "4" if "2 + 2" in question else "6"
+
+        self.engine().run()
+
+        self.assertEqual(self.memo.get("What is 2 + 2?"), "4")
+        self.assertEqual(self.memo.get("What is 3 + 3?"), "6")
+
+    def test_llm_skipped_when_turn_deadline_too_short(self):
+        """Test the engine falls back instead of calling the LLM when the turn budget is exhausted."""
+        FakeRobot.script = [("What is 2 + 2?", "4")]
+        engine = self.engine(turn_deadline=1.0, llm_min_time=2.0)
+
+        reply = engine.run()
+
+        self.assertEqual(engine.state["4242"][0], {
+            "question": "What is 2 + 2?", "answer": FALLBACK_ANSWER, "source": "timeout",
+            "elapsed": engine.state["4242"][0]["elapsed"]
+        })
+        self.assertIn("ERROR", reply["text"])
+        self.llm.assert_not_called()
+
+    def test_wrong_answer_is_not_remembered(self):
+        """Test a rejected answer never reaches the memo."""
+        FakeRobot.script = [("What is 2 + 2?", "5")]
+        self.engine().run()
+        self.assertIsNone(self.memo.get("What is 2 + 2?"))
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+from W4_L01_photos import corrected_url, extract_urls
+
+BASE_URL = "https://centrala.ag3nts.org/dane/barbara"
+
+
+class TestExtractUrls(unittest.TestCase):
+
+    def test_filenames_with_base_url_in_message(self):
+        """Bare filenames are joined with the directory URL given in the message."""
+        message = ("Siemano! Powiem Ci, że mamy takie zdjęcia: IMG_559.PNG, IMG_1410.PNG, IMG_1443.PNG. "
+                   "Wszystkie siedzą sobie tutaj: https://centrala.ag3nts.org/dane/barbara/")
+        self.assertEqual(extract_urls(message), [
+            f"{BASE_URL}/IMG_559.PNG", f"{BASE_URL}/IMG_1410.PNG", f"{BASE_URL}/IMG_1443.PNG"
+        ])
+
+    def test_absolute_url(self):
+        """A full image URL is kept as is, without trailing punctuation."""
+        message = "Proszę, oto poprawione zdjęcie: https://example.org/photos/IMG_559_FXER.PNG."
+        self.assertEqual(extract_urls(message), ["https://example.org/photos/IMG_559_FXER.PNG"])
+
+    def test_default_base_url(self):
+        self.assertEqual(extract_urls("Zrobione! Nowy plik to IMG_1410_FXER.PNG"),
+                         [f"{BASE_URL}/IMG_1410_FXER.PNG"])
+
+    @patch("W4_L01_photos.extract_urls_with_llm", return_value=[])
+    def test_llm_only_without_pattern_match(self, mock_llm):
+        """The LLM is asked only when no filename matches the pattern."""
+        extract_urls("Nie udało się naprawić zdjęcia.")
+        mock_llm.assert_called_once()
+
+
+class TestCorrectedUrl(unittest.TestCase):
+
+    def test_picks_correction_of_own_photo(self):
+        """Other photos and the current file mentioned in the reply are ignored."""
+        message = "Naprawiłem IMG_559.PNG, wynik to IMG_559_FXER.PNG. Zobacz też IMG_1410.PNG"
+        urls = extract_urls(message)
+        self.assertEqual(corrected_url(urls, "IMG_559.PNG", "IMG_559.PNG"), f"{BASE_URL}/IMG_559_FXER.PNG")
+
+    def test_prefers_correction_of_current_file(self):
+        urls = [f"{BASE_URL}/IMG_1410_FXER.PNG", f"{BASE_URL}/IMG_559_NXF4.PNG", f"{BASE_URL}/IMG_559_FXER_NXF4.PNG"]
+        self.assertEqual(corrected_url(urls, "IMG_559.PNG", "IMG_559_FXER.PNG"),
+                         f"{BASE_URL}/IMG_559_FXER_NXF4.PNG")
+
+    def test_no_matching_url(self):
+        """A reply that only repeats the current file or names other photos has no correction."""
+        urls = [f"{BASE_URL}/IMG_559.PNG", f"{BASE_URL}/IMG_5590_FXER.PNG", f"{BASE_URL}/IMG_1410_FXER.PNG"]
+        self.assertIsNone(corrected_url(urls, "IMG_559.PNG", "IMG_559.PNG"))
+
+
+if __name__ == "__main__":
+    unittest.main()
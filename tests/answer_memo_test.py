@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from answer_memo import FUZZY_THRESHOLD, AnswerMemo
+
+
+class TestAnswerMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "memo.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_exact_lookup_ignores_case_and_punctuation(self):
+        """Questions are matched after normalization."""
+        memo = AnswerMemo(self.path)
+        memo.put("What is the capital of France?", "Paris")
+        self.assertEqual(memo.get("what is the capital of france"), "Paris")
+        self.assertIsNone(memo.get("What is capital of France?"))
+
+    def test_fuzzy_lookup(self):
+        """With a threshold, reordered or repeated words still hit the memo."""
+        memo = AnswerMemo(self.path, fuzzy_threshold=FUZZY_THRESHOLD)
+        memo.put("What is the capital city of France?", "Paris")
+        self.assertEqual(memo.get("The capital city of France is what?"), "Paris")
+        self.assertIsNone(memo.get("What is the largest river of Germany?"))
+
+    def test_fuzzy_lookup_requires_same_numbers(self):
+        """Questions that differ only by a number are different questions."""
+        memo = AnswerMemo(self.path, fuzzy_threshold=FUZZY_THRESHOLD)
+        memo.put("What is 2 + 2?", "4")
+        self.assertIsNone(memo.get("What is 2 + 3?"))
+
+    def test_persisted_across_instances(self):
+        """Answers are reloaded from disk."""
+        AnswerMemo(self.path).put("What year is it?", "1999")
+        self.assertEqual(AnswerMemo(self.path).get("what year is it"), "1999")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import time
+import unittest
+from censor_engine import CENSORED, apply_spans, censored_spans
+
+
+class TestCensoredSpans(unittest.TestCase):
+
+    def test_spans_recovered(self):
+        """Spans replaced by CENZURA map back to the original offsets."""
+        original = "Jan Nowak mieszka w Krakowie.\n"
+        censored = f"{CENSORED} mieszka w {CENSORED}.\n"
+        spans = censored_spans(original, censored)
+        self.assertEqual([original[start:end] for start, end, _ in spans], ["Jan Nowak", "Krakowie"])
+        self.assertEqual(apply_spans(original, spans), censored)
+
+    def test_unchanged_text(self):
+        """A reply without CENZURA is only valid when it equals the input."""
+        self.assertEqual(censored_spans("Ala ma kota.", "Ala ma kota."), [])
+        self.assertIsNone(censored_spans("Ala ma kota.", "Ala ma psa."))
+
+    def test_changed_layout_rejected(self):
+        """Edits outside the censored spans (a dropped newline, changed words) are rejected."""
+        original = "Jan Nowak, lat 32.\n"
+        self.assertIsNone(censored_spans(original, f"{CENSORED}, lat {CENSORED}."))
+        self.assertIsNone(censored_spans(original, f"{CENSORED}, wiek {CENSORED}.\n"))
+
+    def test_misaligned_reply_is_fast(self):
+        """A reply that does not line up with a long input is rejected quickly, without backtracking."""
+        record = "Osoba: Jan Nowak, ul. Polna 3, Kraków. Wiek: 32 lata. Telefon nieznany.\n"
+        censored_record = (f"Osoba: {CENSORED} {CENSORED}, ul. {CENSORED}, {CENSORED}. "
+                           f"Wiek: {CENSORED} lata. Telefon nieznany.\n")
+        original = record * 20
+        censored = (censored_record * 20).rstrip("\n")
+        start = time.perf_counter()
+        self.assertIsNone(censored_spans(original, censored))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
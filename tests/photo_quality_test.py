@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+from photo_quality import assess_photo
+
+
+class TestAssessPhoto(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rng = np.random.default_rng(0)
+        self.gradient = np.tile(np.linspace(60, 190, 300), (300, 1))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def save(self, name, pixels):
+        path = os.path.join(self.tmp_dir.name, name)
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path)
+        return path
+
+    def test_well_exposed_photo(self):
+        """A smooth, mid-tone image needs no correction."""
+        command, confidence, _ = assess_photo(self.save("ok.png", self.gradient))
+        self.assertEqual(command, "OK")
+        self.assertGreaterEqual(confidence, 0.8)
+
+    def test_dark_photo(self):
+        command, _, _ = assess_photo(self.save("dark.png", np.full((300, 300), 15)))
+        self.assertEqual(command, "BRIGHTEN")
+
+    def test_bright_photo(self):
+        command, _, _ = assess_photo(self.save("bright.png", np.full((300, 300), 240)))
+        self.assertEqual(command, "DARKEN")
+
+    def test_pixel_noise(self):
+        """Uncorrelated pixel noise is corruption."""
+        command, _, metrics = assess_photo(self.save("noise.png", self.rng.integers(0, 255, (300, 300))))
+        self.assertEqual(command, "REPAIR")
+        self.assertLess(metrics["correlation"], 0.3)
+
+    def test_shifted_rows(self):
+        """A block of shifted, noisy rows is corruption."""
+        glitch = self.gradient.copy()
+        glitch[150:] = np.roll(glitch[150:], 80, axis=1)
+        glitch[150:200] += self.rng.normal(0, 90, (50, 300))
+        command, _, _ = assess_photo(self.save("glitch.png", glitch))
+        self.assertEqual(command, "REPAIR")
+
+    def test_fine_texture_is_not_corruption(self):
+        """High-variance but spatially correlated texture is not rated REPAIR."""
+        y, x = np.mgrid[0:300, 0:300]
+        texture = 128 + 60 * np.sin(x / 2.0) * np.sin(y / 2.3) + self.rng.normal(0, 25, (300, 300))
+        command, _, metrics = assess_photo(self.save("texture.png", texture))
+        self.assertNotEqual(command, "REPAIR")
+        self.assertGreater(metrics["noise"], 0.12)
+
+    def test_undecodable_file(self):
+        path = os.path.join(self.tmp_dir.name, "broken.png")
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\nnot really a png")
+        self.assertEqual(assess_photo(path)[:2], ("REPAIR", 0.99))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from polish_gazetteer import NAME_TRIE, SURNAME_TRIE, fold_diacritics
+
+
+class TestNameTrie(unittest.TestCase):
+
+    def test_nominative_forms(self):
+        """Lexicon names match in the nominative."""
+        self.assertEqual(NAME_TRIE.match("RAFAL")[0], "RAFAL")
+        self.assertEqual(NAME_TRIE.match("BARBARA")[0], "BARBARA")
+
+    def test_masculine_declension(self):
+        """Genitive, dative and instrumental forms map back to the nominative."""
+        self.assertIn("PIOTR", NAME_TRIE.match("PIOTRA"))
+        self.assertIn("PIOTR", NAME_TRIE.match("PIOTROWI"))
+        self.assertIn("PIOTR", NAME_TRIE.match("PIOTREM"))
+
+    def test_instrumental_after_k_and_g(self):
+        """Stems ending in k/g take -iem in the instrumental (Henrykiem, Markiem, Nowakiem)."""
+        self.assertIn("HENRYK", NAME_TRIE.match("HENRYKIEM"))
+        self.assertIn("MAREK", NAME_TRIE.match("MARKIEM"))
+        self.assertIn("NOWAK", SURNAME_TRIE.match("NOWAKIEM"))
+
+    def test_feminine_alternation(self):
+        """Feminine locative forms with a consonant alternation (Barbarze)."""
+        self.assertIn("BARBARA", NAME_TRIE.match("BARBARZE"))
+
+    def test_folded_diacritics(self):
+        """Names with Polish diacritics match after folding."""
+        self.assertIn("LUKASZ", NAME_TRIE.match(fold_diacritics("ŁUKASZEM")))
+
+    def test_unknown_word(self):
+        """Ordinary words do not match any name."""
+        self.assertEqual(NAME_TRIE.match("KOMPUTER"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
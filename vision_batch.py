@@ -0,0 +1,147 @@
+import io
+import json
+import math
+import openai
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from image_payload import ImageSource, prepare_image, payload_content
+
+# Per-request budgets: base64 bytes, estimated image tokens and image count
+BATCH_MAX_BYTES = 8 * 1024 * 1024
+BATCH_MAX_TOKENS = 8000
+BATCH_MAX_IMAGES = 10
+# An image whose payload alone exceeds this is tiled (long, narrow scans) or downscaled
+IMAGE_MAX_BYTES = 2 * 1024 * 1024
+TILE_ASPECT_RATIO = 2.0
+# Vision token accounting: a fixed base plus a cost per 512px tile in high detail
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIDE = 512
+
+
+def image_tokens(payload: dict) -> int:
+    """Estimate the prompt tokens an image payload costs."""
+    if payload["detail"] == "low":
+        return BASE_TOKENS
+    width, height = payload.get("width"), payload.get("height")
+    if not width or not height:
+        # Unknown size (undecodable image): assume the largest high-detail shape
+        return BASE_TOKENS + TILE_TOKENS * 8
+    return BASE_TOKENS + TILE_TOKENS * math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE)
+
+
+def payload_bytes(payload: dict) -> int:
+    return len(payload["base64"])
+
+
+def tile_image(source: ImageSource) -> Optional[List[bytes]]:
+    """Cut a long, narrow image into roughly square PNG tiles along its long side."""
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            width, height = image.size
+            count = math.ceil(max(width, height) / min(width, height))
+            tiles = []
+            for index in range(count):
+                if height >= width:
+                    box = (0, index * height // count, width, (index + 1) * height // count)
+                else:
+                    box = (index * width // count, 0, (index + 1) * width // count, height)
+                buffer = io.BytesIO()
+                image.crop(box).save(buffer, format="PNG")
+                tiles.append(buffer.getvalue())
+            return tiles
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+def image_parts(source: ImageSource, detail: str = "auto", max_bytes: int = IMAGE_MAX_BYTES) -> List[dict]:
+    """Payloads for one image: as is when it fits, else tiled or downscaled."""
+    payload = prepare_image(source, detail)
+    if payload_bytes(payload) <= max_bytes:
+        return [payload]
+    width, height = payload.get("width"), payload.get("height")
+    if payload["detail"] == "high" and width and height and max(width, height) / min(width, height) >= TILE_ASPECT_RATIO:
+        tiles = tile_image(source)
+        if tiles:
+            parts = [prepare_image(tile, "high") for tile in tiles]
+            if all(payload_bytes(part) <= max_bytes for part in parts):
+                return parts
+    return [prepare_image(source, "low")]
+
+
+def pack_batches(items: List[Tuple[str, List[dict]]], max_bytes: int = BATCH_MAX_BYTES,
+                 max_tokens: int = BATCH_MAX_TOKENS, max_images: int = BATCH_MAX_IMAGES) -> List[List[Tuple[str, List[dict]]]]:
+    """Greedily pack (id, payloads) items into batches under the byte, token and image budgets."""
+    batches, current = [], []
+    used_bytes = used_tokens = used_images = 0
+    for item_id, parts in items:
+        size = sum(payload_bytes(part) for part in parts)
+        tokens = sum(image_tokens(part) for part in parts)
+        if current and (used_bytes + size > max_bytes or used_tokens + tokens > max_tokens
+                        or used_images + len(parts) > max_images):
+            batches.append(current)
+            current, used_bytes, used_tokens, used_images = [], 0, 0, 0
+        current.append((item_id, parts))
+        used_bytes += size
+        used_tokens += tokens
+        used_images += len(parts)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_content(batch: List[Tuple[str, List[dict]]]) -> List[dict]:
+    """User message content with every image labelled by its id."""
+    content = []
+    for item_id, parts in batch:
+        label = f"Image id: {item_id}" + (f" ({len(parts)} tiles, top to bottom)" if len(parts) > 1 else "")
+        content.append({"type": "text", "text": label})
+        content += [payload_content(part) for part in parts]
+    return content
+
+
+def batch_verdicts(items: List[Tuple[str, List[dict]]], instructions: str, model: str = "gpt-4o") -> Dict[str, dict]:
+    """Ask for one structured verdict per image, packing the images into as few requests as fit.
+
+    instructions must describe the per-image fields; the reply format
+    {"results": [{"id": ..., ...}]} is added here. Images missing from a
+    reply are simply absent from the result.
+    """
+    verdicts: Dict[str, dict] = {}
+    batches = pack_batches(items)
+    print(f"Vision batching: {len(items)} images in {len(batches)} requests")
+    for batch in batches:
+        try:
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": instructions + '\nReply only with JSON: {"results": [{"id": "<image id>", ...}]}, '
+                                                  'one entry per image id.'
+                    },
+                    {
+                        "role": "user",
+                        "content": batch_content(batch)
+                    }
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.0
+            )
+        except openai.error.OpenAIError as e:
+            # Keep the verdicts of the other batches; these images are simply missing
+            print(f"Vision batch of {len(batch)} images failed: {e}")
+            continue
+        raw = response.choices[0].message.content.strip()
+        try:
+            results = json.loads(raw).get("results", [])
+        except json.JSONDecodeError:
+            print(f"Invalid JSON from vision batch: {raw}")
+            continue
+        for result in results:
+            if isinstance(result, dict) and "id" in result:
+                verdicts[str(result["id"])] = result
+    return verdicts